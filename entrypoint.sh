@@ -4,11 +4,21 @@ set -e
 # Navigate into project directory
 cd shoptech
 
-# Run migrations
-python manage.py migrate --noinput
-
-# Collect static files
-python manage.py collectstatic --noinput
+# One-shot migrations: run "/entrypoint.sh migrate" once per deploy (see the
+# migrate service in docker-compose.yml) instead of on every container boot.
+# Static files are collected when the image is built.
+if [ "$1" = "migrate" ]; then
+    exec python manage.py migrate --noinput
+fi
 
 # Start Gunicorn
-gunicorn shoptech.wsgi:application --bind 0.0.0.0:8000
+# SERVER_MODE=asgi runs uvicorn workers, so async views (catalog, payment
+# status, long-polls, Daraja calls) don't hold a worker while they wait.
+# Under wsgi the payment-status long-poll answers immediately instead.
+# Worker count comes from WEB_CONCURRENCY. --preload imports the app once
+# in the master and forks workers from it.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    exec gunicorn shoptech.asgi:application --bind 0.0.0.0:8000 --preload --worker-class uvicorn_worker.UvicornWorker
+else
+    exec gunicorn shoptech.wsgi:application --bind 0.0.0.0:8000 --preload
+fi
@@ -0,0 +1,37 @@
+"""Synthetic product catalog shared by the benchmarks (unsaved Product rows)."""
+import random
+from decimal import Decimal
+
+GROUPS = ["rings", "necklaces", "bangles", "earrings"]
+COLLECTIONS = ["Classic", "Infinity", "Heritage", "Maasai", "Savannah", None]
+COLORS = ["Gold", "Silver", "Rose Gold", "Black", None]
+WORDS = ("handcrafted sterling silver gold plated beaded maasai adjustable "
+         "minimalist statement layered pendant charm elegant everyday gift").split()
+
+
+def seed_catalog(count, seed=1):
+    from django.utils import timezone
+
+    from shoptechApp.models import Product
+
+    rng = random.Random(seed)
+    products = []
+    for _ in range(count):
+        price = Decimal(rng.randrange(500, 25000, 50))
+        products.append(Product(
+            product_code=f"PRD-{rng.getrandbits(32):08X}",
+            name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {rng.choice(GROUPS)[:-1].title()}",
+            group=rng.choice(GROUPS),
+            collection=rng.choice(COLLECTIONS),
+            color=rng.choice(COLORS),
+            size=rng.choice(["S", "M", "L", "7", "8", None]),
+            price=price,
+            discount_price=price * Decimal("0.85") if rng.random() < 0.3 else None,
+            stock=rng.randrange(0, 200),
+            best_seller=rng.random() < 0.1,
+            description=" ".join(rng.choice(WORDS) for _ in range(rng.randrange(12, 60))),
+            image1=f"products/{rng.getrandbits(40):010x}.jpg",
+            image2=f"products/{rng.getrandbits(40):010x}.jpg" if rng.random() < 0.6 else None,
+            date_posted=timezone.now(),
+        ))
+    return products
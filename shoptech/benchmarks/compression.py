@@ -0,0 +1,98 @@
+"""
+Bytes on the wire vs CPU for compressing API responses.
+
+Seeds an in-memory catalog (no database needed), renders product lists of
+several sizes exactly as ``/products/`` does, and compresses each body with
+gzip and brotli at a few levels, reporting compressed size, ratio and the
+compression/decompression time per response::
+
+    python benchmarks/compression.py --sizes 1,10,50,200,1000
+
+The production defaults are ``COMPRESSION_BROTLI_QUALITY`` /
+``COMPRESSION_GZIP_LEVEL`` in settings; bodies under
+``COMPRESSION_MIN_SIZE`` are sent uncompressed.
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from catalog import seed_catalog
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def render_product_list(products):
+    from django.test import RequestFactory
+    from rest_framework.renderers import JSONRenderer
+
+    from shoptechApp.serializers import ProductSerializer
+
+    request = RequestFactory().get("/products/", HTTP_HOST="api.example.com")
+    return JSONRenderer().render(ProductSerializer(products, many=True, context={"request": request}).data)
+
+
+def codecs():
+    import brotli
+
+    return [
+        ("gzip-1", lambda b: _gzip(b, 1), lambda c: zlib.decompress(c, 31)),
+        ("gzip-6", lambda b: _gzip(b, 6), lambda c: zlib.decompress(c, 31)),
+        ("gzip-9", lambda b: _gzip(b, 9), lambda c: zlib.decompress(c, 31)),
+        ("br-1", lambda b: brotli.compress(b, quality=1), brotli.decompress),
+        ("br-4", lambda b: brotli.compress(b, quality=4), brotli.decompress),
+        ("br-5", lambda b: brotli.compress(b, quality=5), brotli.decompress),
+        ("br-6", lambda b: brotli.compress(b, quality=6), brotli.decompress),
+        ("br-11", lambda b: brotli.compress(b, quality=11), brotli.decompress),
+    ]
+
+
+def _gzip(body, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def time_per_call(fn, arg, min_seconds=0.2):
+    calls, started = 0, time.perf_counter()
+    while True:
+        fn(arg)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,50,200,1000", help="Products per list response")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptech.settings")
+    import django
+    django.setup()
+    from django.conf import settings
+
+    out = sys.stdout
+    out.write(f"Threshold: {settings.COMPRESSION_MIN_SIZE} bytes; defaults: br-{settings.COMPRESSION_BROTLI_QUALITY}, "
+              f"gzip-{settings.COMPRESSION_GZIP_LEVEL}\n")
+    catalog = seed_catalog(max(int(size) for size in args.sizes.split(",")))
+
+    for size in (int(size) for size in args.sizes.split(",")):
+        body = render_product_list(catalog[:size])
+        out.write(f"\n{size} products: {len(body):,} bytes uncompressed\n")
+        out.write(f"{'codec':<8}{'bytes':>10}{'ratio':>8}{'saved':>10}{'compress ms':>13}{'decompress ms':>15}\n")
+        for name, compress, decompress in codecs():
+            compressed = compress(body)
+            out.write(
+                f"{name:<8}{len(compressed):>10,}{len(body) / len(compressed):>8.1f}"
+                f"{len(body) - len(compressed):>10,}"
+                f"{time_per_call(compress, body) * 1000:>13.3f}"
+                f"{time_per_call(decompress, compressed) * 1000:>15.3f}\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
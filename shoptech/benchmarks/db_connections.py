@@ -0,0 +1,135 @@
+"""
+Request latency with and without Postgres connection reuse.
+
+Runs the same requests through the Django WSGI application (so
+``request_started``/``request_finished`` open and close connections exactly
+as under gunicorn) in three configurations, each in a fresh process:
+
+* ``none``        - ``CONN_MAX_AGE=0``: a new connection per request
+* ``persistent``  - ``CONN_MAX_AGE=60`` with health checks
+* ``pool``        - psycopg 3 native pool (``DB_POOL=True``)
+
+Point it at a local Postgres through the usual ``DB_*`` settings, e.g.::
+
+    DB_SSLMODE=require python benchmarks/db_connections.py --requests 500 --concurrency 4
+
+Use ``DB_SSLMODE=require`` against a TLS-enabled server to include the
+handshake cost that production pays.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "none": {"DB_POOL": "False", "DB_CONN_MAX_AGE": "0"},
+    "persistent": {"DB_POOL": "False", "DB_CONN_MAX_AGE": "60"},
+    "pool": {"DB_POOL": "True"},
+}
+
+RESULT_PREFIX = "RESULT "
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_worker(args):
+    """Serve ``--requests`` GETs of ``--path`` in this process and print timings."""
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptech.settings")
+
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    path, _, query = args.path.partition("?")
+
+    def request(_):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "localhost",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": BytesIO(),
+            "wsgi.errors": sys.stderr,
+        }
+        status = []
+        started = time.perf_counter()
+        body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+        try:
+            b"".join(body)
+        finally:
+            body.close()  # fires request_finished, which closes or keeps the connection
+        elapsed = time.perf_counter() - started
+        if not status[0].startswith("200"):
+            raise RuntimeError(f"{args.path} returned {status[0]}")
+        return elapsed
+
+    # Warm up imports and URL resolution on every thread before timing
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(request, range(args.concurrency)))
+        started = time.perf_counter()
+        timings = list(pool.map(request, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    sys.stdout.write(RESULT_PREFIX + json.dumps({"timings": timings, "elapsed": elapsed}) + "\n")
+
+
+def run_mode(mode, args):
+    env = {**os.environ, **MODES[mode]}
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", "--path", args.path,
+         "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+        env=env, cwd=PROJECT_DIR, capture_output=True, text=True,
+    )
+    for line in output.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"{mode} run failed:\n{output.stderr[-2000:]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/products/", help="GET endpoint to hit")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads issuing requests")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma separated subset of: " + ", ".join(MODES))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args)
+
+    out = sys.stdout
+    out.write(f"GET {args.path} x {args.requests}, concurrency {args.concurrency}\n\n")
+    out.write(f"{'mode':<12}{'req/s':>9}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}\n")
+    for mode in args.modes.split(","):
+        result = run_mode(mode, args)
+        values = result["timings"]
+        out.write(
+            f"{mode:<12}{len(values) / result['elapsed']:>9.1f}"
+            f"{statistics.mean(values) * 1000:>10.2f}"
+            f"{percentile(values, 50) * 1000:>10.2f}"
+            f"{percentile(values, 90) * 1000:>10.2f}"
+            f"{percentile(values, 99) * 1000:>10.2f}"
+            f"{max(values) * 1000:>10.2f}\n"
+        )
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+DRF's JSONRenderer/JSONParser vs the orjson pair in shoptechApp.renderers.
+
+Serializes a seeded catalog with ``ProductSerializer`` (what ProductListView
+returns), then times rendering that data and parsing it back with both
+implementations, and checks the rendered bytes are identical::
+
+    python benchmarks/json_rendering.py --products 1000,5000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+from catalog import seed_catalog
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", default="1000,5000", help="Catalog sizes to render")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptech.settings")
+    import django
+    django.setup()
+    from django.test import RequestFactory
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from shoptechApp.renderers import ORJSONParser, ORJSONRenderer
+    from shoptechApp.serializers import ProductSerializer
+
+    request = RequestFactory().get("/products/", HTTP_HOST="api.example.com")
+    sizes = [int(size) for size in args.products.split(",")]
+    catalog = seed_catalog(max(sizes))
+
+    out = sys.stdout
+    out.write(f"{'products':>9}{'bytes':>12}{'serialize ms':>14}{'drf render':>12}{'orjson':>10}{'speedup':>9}"
+              f"{'drf parse':>11}{'orjson':>10}{'speedup':>9}  identical\n")
+    for size in sizes:
+        started = time.perf_counter()
+        data = ProductSerializer(catalog[:size], many=True, context={"request": request}).data
+        serialize = time.perf_counter() - started
+
+        drf_bytes = JSONRenderer().render(data)
+        fast_bytes = ORJSONRenderer().render(data)
+        drf_render = best_of(lambda: JSONRenderer().render(data), args.repeat)
+        fast_render = best_of(lambda: ORJSONRenderer().render(data), args.repeat)
+        drf_parse = best_of(lambda: JSONParser().parse(io.BytesIO(drf_bytes)), args.repeat)
+        fast_parse = best_of(lambda: ORJSONParser().parse(io.BytesIO(drf_bytes)), args.repeat)
+
+        out.write(
+            f"{size:>9}{len(drf_bytes):>12,}{serialize * 1000:>14.1f}"
+            f"{drf_render * 1000:>12.2f}{fast_render * 1000:>10.2f}{drf_render / fast_render:>8.1f}x"
+            f"{drf_parse * 1000:>11.2f}{fast_parse * 1000:>10.2f}{drf_parse / fast_parse:>8.1f}x"
+            f"  {drf_bytes == fast_bytes}\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Load harness for the checkout + M-Pesa payment flow.
+
+Each virtual buyer runs register -> login -> add to cart -> create_from_cart
+-> mpesa/pay -> wait for the callback to settle the payment, and the
+harness reports throughput and latency percentiles per step.
+
+Run it against a server wired to the local Daraja simulator, e.g.::
+
+    python manage.py run_daraja_simulator --port 8001 --callback-delay 2
+    MPESA_BASE_URL=http://127.0.0.1:8001 \\
+    MPESA_CALLBACK_URL=http://127.0.0.1:8000/mpesa/callback/ \\
+        gunicorn shoptech.wsgi:application --bind 127.0.0.1:8000 --workers 4
+    python benchmarks/payment_load.py --base-url http://127.0.0.1:8000 --flows 200 --concurrency 20
+
+At least one product with enough stock must exist (``--product-code`` or
+the first product returned by ``/products/``).
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+STEPS = ["register", "login", "add_to_cart", "create_order", "pay", "confirm", "flow"]
+
+
+class FlowError(Exception):
+    def __init__(self, step, message):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {step: [] for step in STEPS}
+        self.errors = {}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds):
+        with self._lock:
+            self.timings[step].append(seconds)
+
+    def error(self, step, message):
+        with self._lock:
+            self.errors.setdefault(step, []).append(message)
+
+    def outcome(self, status):
+        with self._lock:
+            self.outcomes[status] = self.outcomes.get(status, 0) + 1
+
+
+def timed(recorder, step, fn):
+    started = time.perf_counter()
+    response = fn()
+    recorder.record(step, time.perf_counter() - started)
+    return response
+
+
+def expect(response, step, *codes):
+    if response.status_code not in codes:
+        raise FlowError(step, f"HTTP {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+
+def run_flow(base_url, product_code, phone_number, status_timeout, recorder):
+    session = requests.Session()
+    tag = uuid.uuid4().hex[:12]
+    email = f"load-{tag}@example.com"
+    password = f"Load-{tag}-Pw!"
+    started = time.perf_counter()
+
+    expect(timed(recorder, "register", lambda: session.post(f"{base_url}/register/", json={
+        "username": f"load-{tag}", "first_name": "Load", "last_name": "Test",
+        "email": email, "password": password, "password2": password,
+    })), "register", 201)
+
+    tokens = expect(timed(recorder, "login", lambda: session.post(f"{base_url}/login/", json={
+        "email": email, "password": password,
+    })), "login", 200)
+    session.headers["Authorization"] = f"Bearer {tokens['access']}"
+
+    expect(timed(recorder, "add_to_cart", lambda: session.post(f"{base_url}/cart/", json={
+        "product_code": product_code, "quantity": 1,
+    })), "add_to_cart", 201)
+
+    order = expect(timed(recorder, "create_order", lambda: session.post(
+        f"{base_url}/orders/create_from_cart/"
+    )), "create_order", 201)
+
+    paid_at = time.perf_counter()
+    expect(timed(recorder, "pay", lambda: session.post(f"{base_url}/mpesa/pay/", json={
+        "order_id": order["id"], "phone_number": phone_number,
+    })), "pay", 200, 202)
+
+    status = "initiating"
+    deadline = time.monotonic() + status_timeout
+    while status in ("initiating", "pending", "no_transaction"):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FlowError("confirm", f"payment still {status} after {status_timeout}s")
+        data = expect(session.get(
+            f"{base_url}/orders/{order['id']}/payment-status/wait/",
+            params={"since": status, "timeout": min(remaining, 25)},
+        ), "confirm", 200)
+        status = data["transaction_status"]
+
+    now = time.perf_counter()
+    recorder.record("confirm", now - paid_at)
+    recorder.record("flow", now - started)
+    recorder.outcome(status)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(recorder, flows, elapsed, out=sys.stdout):
+    completed = len(recorder.timings["flow"])
+    out.write(f"\nFlows: {completed}/{flows} completed in {elapsed:.1f}s "
+              f"({completed / elapsed:.2f} flows/s)\n")
+    out.write(f"Payment outcomes: {recorder.outcomes}\n\n")
+    out.write(f"{'step':<14}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}\n")
+    for step in STEPS:
+        values = recorder.timings[step]
+        if not values:
+            continue
+        out.write(
+            f"{step:<14}{len(values):>7}"
+            f"{statistics.mean(values) * 1000:>10.1f}"
+            f"{percentile(values, 50) * 1000:>10.1f}"
+            f"{percentile(values, 90) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}"
+            f"{max(values) * 1000:>10.1f}\n"
+        )
+    for step, messages in recorder.errors.items():
+        out.write(f"\n{len(messages)} error(s) in {step}, e.g. {messages[0]}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--flows", type=int, default=50, help="Total checkout flows to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Flows in flight at once")
+    parser.add_argument("--product-code", default=None)
+    parser.add_argument("--phone-number", default="254700000000")
+    parser.add_argument("--status-timeout", type=float, default=60, help="Seconds to wait for a payment to settle")
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url.rstrip("/")
+    product_code = args.product_code
+    if product_code is None:
+        products = requests.get(f"{base_url}/products/").json()
+        if not products:
+            parser.error("no products found; create one or pass --product-code")
+        product_code = products[0]["product_code"]
+
+    recorder = Recorder()
+
+    def flow(_):
+        try:
+            run_flow(base_url, product_code, args.phone_number, args.status_timeout, recorder)
+        except FlowError as e:
+            recorder.error(e.step, str(e))
+        except requests.exceptions.RequestException as e:
+            recorder.error("network", str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(flow, range(args.flows)))
+    report(recorder, args.flows, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+ProductSerializer vs the ProductValuesSerializer fast path.
+
+Default mode times serialization alone on a seeded in-memory catalog
+(model instances for ProductSerializer, equivalent ``.values()`` rows for
+the fast path) and checks both produce identical data. ``--db`` also times
+the full read path against the database: the queryset (instances vs
+``.values()`` rows) plus serialization, inserting the seeded catalog in a
+transaction that is rolled back afterwards::
+
+    python benchmarks/product_serialization.py --products 100,1000,5000 --db
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from catalog import seed_catalog
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def as_values_row(product, columns):
+    return {column: getattr(product, column).name if column.startswith("image") else getattr(product, column)
+            for column in columns}
+
+
+class Rollback(Exception):
+    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", default="100,1000,5000", help="Catalog sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    parser.add_argument("--db", action="store_true", help="Also time queryset + serialization against the database")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptech.settings")
+    import django
+    django.setup()
+    from django.test import RequestFactory
+
+    from shoptechApp.serializers import ProductSerializer, ProductValuesSerializer
+
+    request = RequestFactory().get("/products/", HTTP_HOST="api.example.com")
+    sizes = [int(size) for size in args.products.split(",")]
+    catalog = seed_catalog(max(sizes))
+
+    def serializer_path(products):
+        return ProductSerializer(products, many=True, context={"request": request}).data
+
+    def fast_path(rows):
+        serializer = ProductValuesSerializer(request)
+        return [serializer.to_representation(row) for row in rows]
+
+    out = sys.stdout
+    out.write("Serialization only (in memory)\n")
+    out.write(f"{'products':>9}{'ProductSerializer ms':>22}{'values fast path ms':>21}{'speedup':>9}  identical\n")
+    columns = ProductValuesSerializer(request).columns
+    for size in sizes:
+        products = catalog[:size]
+        rows = [as_values_row(product, columns) for product in products]
+        slow = best_of(lambda: serializer_path(products), args.repeat)
+        fast = best_of(lambda: fast_path(rows), args.repeat)
+        identical = [dict(item) for item in serializer_path(products)] == fast_path(rows)
+        out.write(f"{size:>9}{slow * 1000:>22.2f}{fast * 1000:>21.2f}{slow / fast:>8.1f}x  {identical}\n")
+
+    if args.db:
+        run_db(args, sizes, catalog, serializer_path, fast_path, columns, out)
+
+
+def run_db(args, sizes, catalog, serializer_path, fast_path, columns, out):
+    from django.db import transaction
+
+    from shoptechApp.models import Product, User
+
+    out.write("\nQueryset + serialization (database, rolled back)\n")
+    out.write(f"{'products':>9}{'instances ms':>14}{'values() ms':>13}{'speedup':>9}\n")
+    try:
+        with transaction.atomic():
+            Product.objects.all().delete()
+            owner = User.objects.create(username="bench-catalog", email="bench-catalog@example.com", role="admin")
+            for product in catalog:
+                product.posted_by = owner
+            Product.objects.bulk_create(catalog, batch_size=1000)
+            for size in sizes:
+                queryset = Product.objects.order_by("-date_posted")[:size]
+                slow = best_of(lambda: serializer_path(list(queryset)), args.repeat)
+                fast = best_of(lambda: fast_path(queryset.values(*columns)), args.repeat)
+                out.write(f"{size:>9}{slow * 1000:>14.2f}{fast * 1000:>13.2f}{slow / fast:>8.1f}x\n")
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
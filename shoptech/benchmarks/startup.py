@@ -0,0 +1,118 @@
+"""
+Cold-start timings for a worker process.
+
+Each run starts a fresh interpreter and times importing ``shoptech.settings``,
+``django.setup()``, importing ``shoptechApp.views`` and the URLconf, and
+the first request through the WSGI application (which opens the database
+connection). ``--boot-steps`` also times what the old entrypoint did on
+every container start (``migrate`` and ``collectstatic``) for comparison::
+
+    python benchmarks/startup.py --runs 5 --boot-steps
+
+Needs the usual runtime settings (``DB_*``, M-Pesa keys...) in the
+environment or ``.env``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+PHASES = ["settings", "django_setup", "views", "first_request", "total"]
+RESULT_PREFIX = "RESULT "
+
+
+def run_worker(path):
+    """Time one cold start in this (fresh) interpreter and print the phases."""
+    started = time.perf_counter()
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shoptech.settings")
+    timings = {}
+
+    mark = time.perf_counter()
+    import shoptech.settings  # noqa: F401
+    timings["settings"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    import django
+    django.setup()
+    timings["django_setup"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    import shoptechApp.views  # noqa: F401
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    timings["views"] = time.perf_counter() - mark
+
+    from io import BytesIO
+
+    from django.core.wsgi import get_wsgi_application
+
+    mark = time.perf_counter()
+    app = get_wsgi_application()
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "",
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+        "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.url_scheme": "http",
+        "wsgi.input": BytesIO(), "wsgi.errors": sys.stderr,
+    }
+    status = []
+    body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+    b"".join(body)
+    body.close()
+    timings["first_request"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - started
+    timings["status"] = status[0]
+
+    sys.stdout.write(RESULT_PREFIX + json.dumps(timings) + "\n")
+
+
+def cold_start(path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", "--path", path],
+        cwd=PROJECT_DIR, capture_output=True, text=True,
+    )
+    for line in output.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"cold start failed:\n{output.stderr[-2000:]}")
+
+
+def timed_command(*args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "manage.py", *args], cwd=PROJECT_DIR, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/products/", help="Endpoint for the first request")
+    parser.add_argument("--boot-steps", action="store_true", help="Also time migrate + collectstatic")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args.path)
+
+    runs = [cold_start(args.path) for _ in range(args.runs)]
+    out = sys.stdout
+    out.write(f"Cold start x {args.runs} (first request: GET {args.path} -> {runs[0]['status']})\n\n")
+    out.write(f"{'phase':<16}{'median ms':>11}{'min ms':>10}{'max ms':>10}\n")
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs]
+        out.write(f"{phase:<16}{statistics.median(values):>11.1f}{min(values):>10.1f}{max(values):>10.1f}\n")
+
+    if args.boot_steps:
+        out.write("\nPer-boot steps the entrypoint no longer runs:\n")
+        out.write(f"{'migrate --noinput':<30}{timed_command('migrate', '--noinput') * 1000:>10.1f} ms\n")
+        out.write(f"{'collectstatic --noinput':<30}{timed_command('collectstatic', '--noinput') * 1000:>10.1f} ms\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,9 @@ from pathlib import Path
 
 from datetime import timedelta
 import os
+import sys
 from decouple import config, Csv
-from dotenv import load_dotenv
-
-load_dotenv()
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,20 +53,49 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shoptechApp.authentication.StatelessJWTAuthentication",
+    ),
+    # ✅ orjson: same bytes as DRF's JSON renderer/parser, several times faster
+    "DEFAULT_RENDERER_CLASSES": (
+        "shoptechApp.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "shoptechApp.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ),
+    # Sliding-window limits per throttle_scope (see shoptechApp/throttling.py)
+    "DEFAULT_THROTTLE_RATES": {
+        "register": config("RATE_LIMIT_REGISTER", default="10/hour"),
+        "login": config("RATE_LIMIT_LOGIN", default="20/min"),
+        "contact": config("RATE_LIMIT_CONTACT", default="5/min"),
+        "mpesa_callback": config("RATE_LIMIT_MPESA_CALLBACK", default="600/min"),
+        "mpesa_simulate": config("RATE_LIMIT_MPESA_SIMULATE", default="30/min"),
+    },
+    # Reverse proxies in front of the app; client IPs come from X-Forwarded-For
+    # only that many hops deep, so clients can't pick their own throttle key.
+    # 0 (gunicorn exposed directly) uses REMOTE_ADDR.
+    "NUM_PROXIES": config("NUM_PROXIES", default=0, cast=int),
 }
 
+# "local" counts per worker process, "cache" shares counters through CACHES
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="local")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "shoptechApp.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "shoptechApp.serializers.ClaimsTokenRefreshSerializer",
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shoptechApp.middleware.StaticFilesMiddleware',  # ✅ static files (WhiteNoise)
+    'shoptechApp.middleware.CompressionMiddleware',  # ✅ brotli/gzip for JSON API responses
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +103,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'shoptechApp.db_routers.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'shoptech.urls'
@@ -101,6 +130,17 @@ WSGI_APPLICATION = 'shoptech.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # Database
+# ✅ Reuse Postgres connections instead of paying a TLS handshake per request.
+# DB_POOL=True uses psycopg 3's native pool (Django needs CONN_MAX_AGE=0 then);
+# otherwise each worker thread keeps its connection for DB_CONN_MAX_AGE seconds
+# and checks it is still alive before reusing it.
+# Under ASGI (SERVER_MODE=asgi, see entrypoint.sh) connections belong to each
+# request's thread/context and are never reused, so persistent ones would only
+# pile up idle: they are closed after every request there, and DB_POOL=True is
+# the way to reuse them.
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+SERVER_MODE = config("SERVER_MODE", default="wsgi")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -109,12 +149,45 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD"),
         "HOST": config("DB_HOST", default="127.0.0.1"),
         "PORT": config("DB_PORT", default="5432"),
+        "CONN_MAX_AGE": 0 if DB_POOL or SERVER_MODE == "asgi" else config("DB_CONN_MAX_AGE", default=60, cast=int),
+        "CONN_HEALTH_CHECKS": True,
         "OPTIONS": {
-            'sslmode': 'require',   
+            "sslmode": config("DB_SSLMODE", default="require"),
         },
     }
 }
 
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+        "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+        "timeout": config("DB_POOL_TIMEOUT", default=10, cast=int),
+    }
+
+# ✅ Optional read replicas (same credentials as default), e.g.
+# DB_REPLICA_HOSTS=replica-1.internal,replica-2.internal
+# Catalog and order-history GETs read from them; see shoptechApp/db_routers.py
+DATABASE_REPLICAS = []
+for index, host in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv())):
+    alias = f"replica_{index + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# manage.py test: a "replica" alias mirroring the test database, so routing
+# tests can list it in DATABASE_REPLICAS (nothing is routed to it otherwise)
+if sys.argv[1:2] == ["test"]:
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+DATABASE_ROUTERS = ["shoptechApp.db_routers.ReplicaRouter"]
+
+# Seconds a user keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+
 
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,6 +207,66 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# Per-process memory by default; set REDIS_URL to share it between workers
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Authorise requests from the access token's claims without loading the
+# User row (see shoptechApp/authentication.py). Revocations live in the
+# cache, so every worker must share it: on by default with REDIS_URL only.
+JWT_STATELESS_AUTH = config("JWT_STATELESS_AUTH", default=bool(REDIS_URL), cast=bool)
+if JWT_STATELESS_AUTH and not REDIS_URL:
+    raise ImproperlyConfigured("JWT_STATELESS_AUTH needs a shared cache for token revocation: set REDIS_URL.")
+
+# Paid order receipts (orders/<id>/success/), dropped when the order changes
+# (see shoptechApp/receipt_cache.py)
+ORDER_RECEIPT_CACHE_TTL = config("ORDER_RECEIPT_CACHE_TTL", default=60 * 60 * 24, cast=int)
+
+# Product rows behind products/<code>/ and products/batch/, stock levels
+# behind products/stock/ (see shoptechApp/product_cache.py)
+PRODUCT_CACHE_TTL = config("PRODUCT_CACHE_TTL", default=60, cast=int)
+STOCK_CACHE_TTL = config("STOCK_CACHE_TTL", default=30, cast=int)
+
+# Products flagged best_seller by recompute_sales_rollup (see shoptechApp/sales.py)
+BEST_SELLER_COUNT = config("BEST_SELLER_COUNT", default=12, cast=int)
+
+# Neighbours kept per product by refresh_related_products (see shoptechApp/related_products.py)
+RELATED_PRODUCTS_COUNT = config("RELATED_PRODUCTS_COUNT", default=8, cast=int)
+PRODUCT_BATCH_MAX_CODES = config("PRODUCT_BATCH_MAX_CODES", default=300, cast=int)
+
+# Days already rolled up that rollup_daily_sales rebuilds on every run (see shoptechApp/analytics.py)
+SALES_ROLLUP_LOOKBACK_DAYS = config("SALES_ROLLUP_LOOKBACK_DAYS", default=2, cast=int)
+# Longest date range the admin analytics endpoints accept
+ANALYTICS_MAX_DAYS = config("ANALYTICS_MAX_DAYS", default=366, cast=int)
+
+
+# Password hashing pool (see shoptechApp/hashing.py)
+AUTH_HASH_WORKERS = config("AUTH_HASH_WORKERS", default=2, cast=int)
+AUTH_HASH_MAX_QUEUE = config("AUTH_HASH_MAX_QUEUE", default=32, cast=int)
+AUTH_HASH_QUEUE_TIMEOUT = config("AUTH_HASH_QUEUE_TIMEOUT", default=5, cast=float)  # seconds
+
+
+# Response compression (see shoptechApp/middleware.py). Brotli quality 5 and
+# gzip level 6 get close to max-level sizes at a small fraction of the CPU
+# (benchmarks/compression.py).
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)  # bytes
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", default=5, cast=int)
+COMPRESSION_GZIP_LEVEL = config("COMPRESSION_GZIP_LEVEL", default=6, cast=int)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -164,13 +297,19 @@ AWS_QUERYSTRING_AUTH = False
 AWS_DEFAULT_ACL = None  # prevents private uploads
 
 # Default local storage (dev)
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")  # <-- add this
 
+# ✅ collectstatic (at image build) writes content-hashed copies plus .gz/.br
+# variants; StaticFilesMiddleware serves them with far-future cache headers
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "shoptechApp.storage.StaticFilesStorage"},
+}
+
 # AWS S3 configuration (production)
 USE_S3 = config('USE_S3', default=False, cast=bool)
 
@@ -185,7 +324,7 @@ if USE_S3:
     AWS_S3_CUSTOM_DOMAIN = f"{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com"
 
     # Media files
-    DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
+    STORAGES["default"] = {"BACKEND": "storages.backends.s3boto3.S3Boto3Storage"}
     MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
 
 else:
@@ -200,12 +339,28 @@ MPESA_PASSKEY = config("MPESA_PASSKEY")
 MPESA_SHORTCODE = config("BUSINESS_SHORTCODE")
 MPESA_CALLBACK_URL = config("MPESA_CALLBACK_URL")
 MPESA_BASE_URL = config("MPESA_BASE_URL", default="https://sandbox.safaricom.co.ke")
+MPESA_TIMEOUT = config("MPESA_TIMEOUT", default=30, cast=int)  # seconds per Daraja request
+
+# Return 202 from mpesa/pay/ and send the STK push from a background worker
+MPESA_ASYNC_STK_PUSH = config("MPESA_ASYNC_STK_PUSH", default=False, cast=bool)
+
+# Callback inbox: rows drained per batch and retry policy for failed rows
+MPESA_CALLBACK_BATCH_SIZE = config("MPESA_CALLBACK_BATCH_SIZE", default=100, cast=int)
+MPESA_CALLBACK_MAX_ATTEMPTS = config("MPESA_CALLBACK_MAX_ATTEMPTS", default=5, cast=int)
+MPESA_CALLBACK_RETRY_DELAY = config("MPESA_CALLBACK_RETRY_DELAY", default=30, cast=int)  # seconds, doubles per attempt
+
+# Long-polling payment status: "cache" signals through the shared cache, so a
+# callback applied by any process (web worker, callbacks/reconcile workers)
+# wakes the waiter, and needs REDIS_URL. "local" wakes waiters in the same
+# process only: single-process development.
+PAYMENT_STATUS_CHANNEL = config("PAYMENT_STATUS_CHANNEL", default="cache" if REDIS_URL else "local")
+if PAYMENT_STATUS_CHANNEL == "cache" and not REDIS_URL:
+    raise ImproperlyConfigured("PAYMENT_STATUS_CHANNEL=cache needs a shared cache: set REDIS_URL.")
+PAYMENT_STATUS_POLL_INTERVAL = config("PAYMENT_STATUS_POLL_INTERVAL", default=0.5, cast=float)
+PAYMENT_STATUS_WAIT_DEFAULT = config("PAYMENT_STATUS_WAIT_DEFAULT", default=25, cast=int)
+PAYMENT_STATUS_WAIT_MAX = config("PAYMENT_STATUS_WAIT_MAX", default=30, cast=int)
+
+# In-process background task pool (see shoptechApp/tasks.py)
+BACKGROUND_WORKERS = config("BACKGROUND_WORKERS", default=4, cast=int)
+BACKGROUND_TASKS_EAGER = config("BACKGROUND_TASKS_EAGER", default=False, cast=bool)
 
-
-
-
-# Debug M-Pesa settings (remove in production)
-print(f"🔍 M-Pesa Consumer Key: {MPESA_CONSUMER_KEY[:10]}...")
-print(f"🔍 M-Pesa Base URL: {MPESA_BASE_URL}")
-print(f"🔍 M-Pesa Shortcode: {MPESA_SHORTCODE}")
-print(f"🔍 M-Pesa Callback URL: {MPESA_CALLBACK_URL}")
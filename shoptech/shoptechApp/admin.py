@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from .models import *
 
 
@@ -52,6 +53,34 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 
+# ✅ Best-seller rollup (maintained by payments and recompute_sales_rollup; read-only)
+@admin.register(ProductSales)
+class ProductSalesAdmin(admin.ModelAdmin):
+    list_display = ("product", "units_7d", "revenue_7d", "units_30d", "revenue_30d", "updated_at")
+    ordering = ("-units_30d", "-revenue_30d")
+    search_fields = ("product__name", "product__product_code")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ✅ Daily sales rollup (maintained by rollup_daily_sales; read-only)
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ("day", "orders", "units", "revenue", "payments_success", "payments_failed", "payment_success_rate", "updated_at")
+    ordering = ("-day",)
+    date_hierarchy = "day"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # ✅ Cart Item Inline (shows items inside CartAdmin)
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -150,3 +179,19 @@ class CustomerAddressAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Transaction)
+
+
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    list_display = ("id", "checkout_id", "status", "attempts", "received_at", "next_attempt_at", "processed_at")
+    list_filter = ("status", "received_at")
+    search_fields = ("checkout_id",)
+    readonly_fields = ("payload", "checkout_id", "attempts", "last_error", "received_at", "processed_at")
+    actions = ["retry_callbacks"]
+
+    @admin.action(description="Retry selected callbacks")
+    def retry_callbacks(self, request, queryset):
+        updated = queryset.exclude(status="processed").update(
+            status="received", attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} callback(s) queued for retry.")
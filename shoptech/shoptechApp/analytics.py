@@ -0,0 +1,141 @@
+"""
+Daily sales rollups behind the admin analytics endpoints.
+
+``rollup_daily_sales`` (``manage.py rollup_daily_sales``, run periodically)
+rebuilds whole days of ``DailySales``, ``DailyProductSales`` and
+``DailyGroupSales`` from paid orders and M-Pesa transactions. Each run
+redoes the last ``SALES_ROLLUP_LOOKBACK_DAYS`` days already rolled up
+(late callbacks keep changing recent days) through today, so it only ever
+reads a few days of orders and can be rerun safely; the first run
+backfills from the oldest order.
+
+The endpoints read only these tables, so a report costs one row per day
+(per product or group) in the range, however many orders it covers.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .db_routers import replica_reads
+from .models import DailyGroupSales, DailyProductSales, DailySales, Order, Transaction
+from .sales import paid_items
+
+TOTALS = ("orders", "units", "revenue")
+PAYMENT_OUTCOMES = {
+    "payments_success": Q(status="success"),
+    "payments_failed": Q(status="failed"),
+    "payments_pending": Q(status__in=("initiating", "pending")),
+}
+
+
+def _day_range(first_day, last_day):
+    """``[start, end)`` datetimes covering ``first_day`` through ``last_day``."""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(first_day, time.min, tzinfo=tz),
+        datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def _days(first_day, last_day):
+    return [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+
+def default_rollup_start(today):
+    """Lookback from the latest day rolled up, or the first order's day on the first run."""
+    latest = DailySales.objects.aggregate(day=Max("day"))["day"]
+    if latest is not None:
+        return min(latest, today) - timedelta(days=settings.SALES_ROLLUP_LOOKBACK_DAYS)
+    first_order = Order.objects.aggregate(created=Min("created_at"))["created"]
+    return timezone.localdate(first_order) if first_order else today
+
+
+def rollup_daily_sales(since=None, until=None):
+    """
+    Rebuild the rollups for every day from ``since`` to ``until`` (dates,
+    inclusive) and return a dict of counters.
+
+    Sales count on the day the order was paid (see ``paid_items``); payment
+    outcomes on the day the transaction started. Reads go to a replica when
+    one is configured; the rows are replaced in one transaction.
+    """
+    until = until or timezone.localdate()
+    since = since or default_rollup_start(until)
+    start, end = _day_range(since, until)
+    totals = {
+        "orders": Count("order_id", distinct=True),
+        "units": Sum("quantity"),
+        "revenue": Sum(F("price") * F("quantity")),
+    }
+
+    with replica_reads():
+        items = paid_items(start, end).annotate(day=TruncDate("paid_at")).order_by()
+        by_day = {row.pop("day"): row for row in items.values("day").annotate(**totals)}
+        by_product = list(items.values("day", "product_id").annotate(**totals))
+        by_group = list(items.values("day", group=F("product__group")).annotate(**totals))
+        payments = {
+            row.pop("day"): row
+            for row in Transaction.objects.filter(created_at__gte=start, created_at__lt=end)
+            .annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(**{name: Count("id", filter=outcome) for name, outcome in PAYMENT_OUTCOMES.items()})
+            .order_by()
+        }
+
+    # Every day gets a row, so gaps in a report mean "not rolled up yet"
+    days = [
+        DailySales(day=day, **by_day.get(day, {}), **payments.get(day, {}))
+        for day in _days(since, until)
+    ]
+    with transaction.atomic():
+        for model in (DailySales, DailyProductSales, DailyGroupSales):
+            model.objects.filter(day__gte=since, day__lte=until).delete()
+        DailySales.objects.bulk_create(days)
+        DailyProductSales.objects.bulk_create([DailyProductSales(**row) for row in by_product], batch_size=1000)
+        DailyGroupSales.objects.bulk_create([DailyGroupSales(**row) for row in by_group])
+
+    return {
+        "days": len(days),
+        "orders": sum(row["orders"] for row in by_day.values()),
+        "product_rows": len(by_product),
+        "group_rows": len(by_group),
+    }
+
+
+def _sum_totals():
+    return {name: Sum(name, default=Decimal(0) if name == "revenue" else 0) for name in TOTALS}
+
+
+def sales_report(first_day, last_day):
+    """
+    ``(days, totals)``: the range's ``DailySales`` rows in order, and an
+    unsaved ``DailySales`` summing them.
+    """
+    days = list(DailySales.objects.filter(day__gte=first_day, day__lte=last_day).order_by("day"))
+    totals = DailySales(**{name: sum(getattr(day, name) for day in days) for name in (*TOTALS, *PAYMENT_OUTCOMES)})
+    return days, totals
+
+
+def top_products(first_day, last_day, limit):
+    """Best products by revenue over the range, from ``DailyProductSales``."""
+    return list(
+        DailyProductSales.objects.filter(day__gte=first_day, day__lte=last_day)
+        .values("product_id", product_code=F("product__product_code"), name=F("product__name"))
+        .annotate(**_sum_totals())
+        .order_by("-revenue", "-units", "product_id")[:limit]
+    )
+
+
+def group_totals(first_day, last_day):
+    """Totals per product group over the range, from ``DailyGroupSales``."""
+    return list(
+        DailyGroupSales.objects.filter(day__gte=first_day, day__lte=last_day)
+        .values("group")
+        .annotate(**_sum_totals())
+        .order_by("-revenue", "group")
+    )
@@ -0,0 +1,110 @@
+"""
+Helpers for native async API views.
+
+DRF views are synchronous, so under ASGI each one occupies a thread for its
+whole duration. The hot read-only endpoints and the calls that wait on
+Daraja are written as async Django views instead, using these helpers to
+keep DRF's behaviour: the same authentication classes, parsers and renderer
+(so responses are byte-for-byte what DRF would send), ``{"detail": ...}``
+errors and read-replica routing.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .db_routers import ais_pinned_to_primary, replica_reads
+
+
+def render(data, status=status.HTTP_200_OK, headers=None):
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    response = HttpResponse(
+        renderer.render(data, renderer_context={"indent": None}),
+        status=status,
+        content_type=f"{renderer.media_type}; charset={renderer.charset}" if renderer.charset else renderer.media_type,
+    )
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def render_exception(exc, request):
+    headers = {"Retry-After": str(int(exc.wait))} if getattr(exc, "wait", None) else {}
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+        # like APIView.permission_denied: name the scheme clients should use
+        authenticators = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        header = authenticators[0]().authenticate_header(request) if authenticators else None
+        if header:
+            headers["WWW-Authenticate"] = header
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return render(detail, status=exc.status_code, headers=headers)
+
+
+async def authenticate(request):
+    """
+    Run the DRF authentication classes; returns the user or ``None`` when no
+    credentials were sent. Bad or expired ones raise ``AuthenticationFailed``.
+    """
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = await sync_to_async(authentication_class().authenticate)(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def request_data(request):
+    """Parse the body with the DRF parsers, like ``request.data``."""
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+
+
+async def _handle(request, handler, args, kwargs, require_auth, use_replica):
+    try:
+        user = await authenticate(request)
+        if user is not None:
+            request.user = user
+        elif require_auth:
+            raise NotAuthenticated()
+
+        if use_replica and request.method in ("GET", "HEAD") and not await ais_pinned_to_primary(user):
+            with replica_reads():
+                return await handler(request, *args, **kwargs)
+        return await handler(request, *args, **kwargs)
+    except APIException as exc:
+        return render_exception(exc, request)
+
+
+def async_api_view(methods, require_auth=True, use_replica=False):
+    """Decorator for async function views, the async counterpart of ``@api_view``."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return render({"detail": f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            return await _handle(request, view, args, kwargs, require_auth, use_replica)
+
+        return csrf_exempt(wrapped)  # token authenticated, like DRF views
+
+    return decorator
+
+
+class AsyncAPIView(View):
+    """Class-based async read view: subclasses define ``async def get``."""
+
+    require_auth = False
+    use_replica = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return render({"detail": f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        return await _handle(request, handler, args, kwargs, self.require_auth, self.use_replica)
@@ -0,0 +1,77 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's id, email, role and staff flags, so most
+requests can be authorised without loading the ``User`` row. The user
+handed to views is a ``ClaimsUser`` built from those claims; any other
+field is loaded from the database the first time a view touches it.
+
+Deactivating or deleting a user, or changing a field carried in the claims
+(role, staff flags, email), writes a new revocation stamp in the cache.
+Tokens carry the stamp current when they were issued, so every token
+issued before the change fails as invalid while tokens issued after it
+(even within the same second) are accepted, and a refresh re-reads the
+user. The stamp must be seen by every worker, so claim-only auth is only
+enabled (``JWT_STATELESS_AUTH``) with a shared cache (``REDIS_URL``);
+otherwise the user is loaded from the database on every request.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import ClaimsUser
+
+USER_CLAIMS = ("email", "role", "is_staff", "is_superuser")
+# The user's revocation stamp when the token was issued
+REVOCATION_CLAIM = "rev"
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[REVOCATION_CLAIM] = cache.get(_revocation_key(user.pk))
+    return token
+
+
+def tokens_for_user(user):
+    """Refresh token (and, through it, access token) carrying the user claims."""
+    return add_user_claims(RefreshToken.for_user(user), user)
+
+
+def _revocation_key(user_id):
+    return f"jwt-revoked:{user_id}"
+
+
+def revoke_user_tokens(user_id):
+    """Reject every access token issued to this user up to now."""
+    lifetime = settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds()
+    cache.set(_revocation_key(user_id), uuid.uuid4().hex, timeout=int(lifetime) + 60)
+
+
+def is_token_revoked(user_id, stamp):
+    """True when the user's tokens were revoked after this token was issued."""
+    revoked = cache.get(_revocation_key(user_id))
+    return revoked is not None and revoked != stamp
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not settings.JWT_STATELESS_AUTH or any(claim not in validated_token for claim in USER_CLAIMS):
+            # No shared cache to see revocations in, or a token issued before the claims were added
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if is_token_revoked(user_id, validated_token.get(REVOCATION_CLAIM)):
+            raise InvalidToken(_("Token has been revoked"))
+
+        return ClaimsUser.from_claims(validated_token)
@@ -0,0 +1,241 @@
+"""
+Local stand-in for the Safaricom Daraja API.
+
+Implements OAuth, STK push and STK query closely enough for tests, local
+development and load testing without touching the Safaricom sandbox::
+
+    simulator = DarajaSimulator(latency=0.2, decline_rate=0.1, callback_delay=2)
+    simulator.start()
+    # point settings.MPESA_BASE_URL at simulator.base_url
+    simulator.stop()
+
+After an STK push the simulator waits ``callback_delay`` seconds, decides
+the outcome (declined with probability ``decline_rate``) and POSTs the
+callback to the push's ``CallBackURL`` (or ``callback_url`` if given).
+``failure_rate`` makes any request fail with a 503, and ``latency`` is added
+to every response. Run it standalone with ``manage.py run_daraja_simulator``.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class DarajaSimulator:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0,
+                 decline_rate=0.0, callback_delay=None, callback_url=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.callback_delay = callback_delay
+        self.callback_url = callback_url
+        self.results = {}  # checkout id -> (result code, result description)
+        self.requests = []  # (method, path) of every request served
+        self.stats = {"pushes": 0, "queries": 0, "errors": 0, "callbacks_sent": 0, "callbacks_failed": 0}
+        self._tokens = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def set_result(self, checkout_id, result_code, result_desc=""):
+        with self._lock:
+            self.results[checkout_id] = (str(result_code), result_desc)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _chance(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    # Endpoint implementations return (status code, JSON body)
+
+    def oauth(self, body, headers):
+        if not (headers.get("Authorization") or "").startswith("Basic "):
+            return 400, {"errorCode": "400.008.01", "errorMessage": "Invalid Authentication passed"}
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens.add(token)
+        return 200, {"access_token": token, "expires_in": "3599"}
+
+    def stk_push(self, body, headers):
+        for field in ("BusinessShortCode", "Password", "Timestamp", "Amount", "PhoneNumber", "CallBackURL"):
+            if not body.get(field):
+                return 400, {
+                    "requestId": uuid.uuid4().hex,
+                    "errorCode": "400.002.02",
+                    "errorMessage": f"Bad Request - Invalid {field}",
+                }
+
+        self._count("pushes")
+        merchant_request_id = f"{self._random.randint(10000, 99999)}-{uuid.uuid4().hex[:8]}-1"
+        checkout_id = f"ws_CO_{datetime.now().strftime('%d%m%Y%H%M%S')}{uuid.uuid4().hex[:12]}"
+
+        if self.callback_delay is not None:
+            timer = threading.Timer(
+                self.callback_delay,
+                self._complete_push,
+                args=(checkout_id, merchant_request_id, body),
+            )
+            timer.daemon = True
+            timer.start()
+
+        return 200, {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        }
+
+    def stk_query(self, body, headers):
+        self._count("queries")
+        checkout_id = body.get("CheckoutRequestID")
+        with self._lock:
+            result = self.results.get(checkout_id)
+
+        if result is None:
+            return 500, {
+                "requestId": uuid.uuid4().hex,
+                "errorCode": "500.001.1001",
+                "errorMessage": "The transaction is being processed",
+            }
+
+        result_code, result_desc = result
+        return 200, {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": uuid.uuid4().hex,
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": result_code,
+            "ResultDesc": result_desc,
+        }
+
+    def _complete_push(self, checkout_id, merchant_request_id, push):
+        callback = {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_id,
+        }
+        if self._chance(self.decline_rate):
+            callback.update({"ResultCode": 1032, "ResultDesc": "Request cancelled by user"})
+        else:
+            callback.update({
+                "ResultCode": 0,
+                "ResultDesc": "The service request is processed successfully.",
+                "CallbackMetadata": {
+                    "Item": [
+                        {"Name": "Amount", "Value": push["Amount"]},
+                        {"Name": "MpesaReceiptNumber", "Value": uuid.uuid4().hex[:10].upper()},
+                        {"Name": "TransactionDate", "Value": int(datetime.now().strftime("%Y%m%d%H%M%S"))},
+                        {"Name": "PhoneNumber", "Value": int(push["PhoneNumber"])},
+                    ]
+                },
+            })
+        self.set_result(checkout_id, callback["ResultCode"], callback["ResultDesc"])
+
+        try:
+            response = requests.post(
+                self.callback_url or push["CallBackURL"],
+                json={"Body": {"stkCallback": callback}},
+                timeout=30,
+            )
+            response.raise_for_status()
+            self._count("callbacks_sent")
+        except requests.exceptions.RequestException:
+            self._count("callbacks_failed")
+
+    def routes(self):
+        return {
+            ("GET", "/oauth/v1/generate"): (self.oauth, False),
+            ("POST", "/mpesa/stkpush/v1/processrequest"): (self.stk_push, True),
+            ("POST", "/mpesa/stkpushquery/v1/query"): (self.stk_query, True),
+        }
+
+    def handle(self, method, path, body, headers):
+        route = self.routes().get((method, path))
+        if route is None:
+            return 404, {"errorMessage": f"Unknown endpoint {path}"}
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self._chance(self.failure_rate):
+            self._count("errors")
+            return 503, {"errorCode": "503.001.01", "errorMessage": "Service is currently unavailable"}
+
+        endpoint, needs_token = route
+        if needs_token:
+            token = (headers.get("Authorization") or "").removeprefix("Bearer ")
+            with self._lock:
+                known = token in self._tokens
+            if not known:
+                return 401, {"errorCode": "404.001.04", "errorMessage": "Invalid Access Token"}
+        return endpoint(body, headers)
+
+
+def _handler_for(simulator):
+    class Handler(BaseHTTPRequestHandler):
+        def _dispatch(self, method):
+            path = self.path.split("?", 1)[0]
+            with simulator._lock:
+                simulator.requests.append((method, path))
+
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send(400, {"errorMessage": "Invalid JSON"})
+            self._send(*simulator.handle(method, path, body, self.headers))
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,119 @@
+"""
+Read-replica routing.
+
+Writes, ``select_for_update`` and anything inside ``get_or_create`` always go
+to ``default``. Plain reads go to a replica only while a view that opted in
+with ``ReplicaReadMixin`` is handling a GET/HEAD/OPTIONS request, so every
+other code path keeps reading its own writes from the primary. Async views
+use the ``replica_reads()`` block instead (see ``async_api``).
+
+A user who has just written something (cart, checkout, profile...) is pinned
+to the primary for ``REPLICA_STICKY_SECONDS`` so replication lag never hides
+their own changes. ``ReplicaStickinessMiddleware`` records those writes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+def _sticky_key(user_id):
+    return f"db-sticky:{user_id}"
+
+
+def pin_to_primary(user_id):
+    cache.set(_sticky_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return bool(user and user.is_authenticated and cache.get(_sticky_key(user.pk)))
+
+
+async def ais_pinned_to_primary(user):
+    return bool(user and user.is_authenticated and await cache.aget(_sticky_key(user.pk)))
+
+
+@contextmanager
+def replica_reads():
+    """Send reads made inside the block (including async ORM calls) to a replica."""
+    token = _read_from_replica.set(bool(settings.DATABASE_REPLICAS))
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and _read_from_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """Serve safe requests of a DRF view from a read replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_from_replica.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_from_replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # After authentication, so a user who just wrote stays on the primary
+        if (settings.DATABASE_REPLICAS and request.method in SAFE_METHODS
+                and not is_pinned_to_primary(request.user)):
+            _read_from_replica.set(True)
+
+
+class ReplicaStickinessMiddleware:
+    """Pin users to the primary for a while after a successful write request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user_id = self._writer_id(request, response)
+        if user_id is not None:
+            pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user_id = self._writer_id(request, response)
+        if user_id is not None:
+            await cache.aset(_sticky_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def _writer_id(self, request, response):
+        if (not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS
+                or response.status_code >= 400):
+            return None
+        # DRF (and async_api) put the authenticated user on the Django request
+        user = getattr(request, "user", None)
+        return user.pk if user is not None and user.is_authenticated else None
@@ -0,0 +1,125 @@
+"""
+Bounded execution pool for password hashing.
+
+PBKDF2 is deliberately slow. Left unbounded, a burst of logins or sign-ups
+(credential stuffing) pins every CPU and stalls the rest of the API.
+``User.set_password`` and ``User.check_password`` hand their hashing to this
+pool instead: at most ``AUTH_HASH_WORKERS`` hashes run at once, up to
+``AUTH_HASH_MAX_QUEUE`` more wait for up to ``AUTH_HASH_QUEUE_TIMEOUT``
+seconds, and anything beyond that raises ``HashPoolBusy``. The login and
+register views answer that with a 503 and ``Retry-After``; elsewhere
+(admin, management commands) it is a plain error.
+
+The calling thread still waits for its hash, so this bounds CPU use, not
+request threads. The limits apply per process: with N worker processes up
+to N * ``AUTH_HASH_WORKERS`` hashes run at once.
+"""
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+
+class HashPoolBusy(Exception):
+    """The queue is full, or the hash waited ``AUTH_HASH_QUEUE_TIMEOUT`` for a worker."""
+
+
+class HashingPool:
+    def __init__(self, workers, max_queue, queue_timeout):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+        self._lock = threading.Lock()
+        self._hash_seconds = deque(maxlen=1000)
+        self._wait_seconds = deque(maxlen=1000)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.queue_depth >= self.max_queue:
+                self.rejected += 1
+                raise HashPoolBusy("password hashing queue is full")
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        future = self._executor.submit(self._call, time.perf_counter(), fn, args, kwargs)
+        try:
+            return future.result(timeout=self.queue_timeout)
+        except FutureTimeout:
+            if future.cancel():  # still queued: give up on it
+                with self._lock:
+                    self.queue_depth -= 1
+                    self.timed_out += 1
+                raise HashPoolBusy("timed out waiting for a password hashing worker")
+            return future.result()  # already hashing: let it finish
+
+    def _call(self, enqueued_at, fn, args, kwargs):
+        started = time.perf_counter()
+        with self._lock:
+            self.queue_depth -= 1
+            self.in_flight += 1
+            self._wait_seconds.append(started - enqueued_at)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self._hash_seconds.append(time.perf_counter() - started)
+
+    def metrics(self):
+        with self._lock:
+            hash_seconds = list(self._hash_seconds)
+            wait_seconds = list(self._wait_seconds)
+            counters = {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+        counters["hash_latency_ms"] = _summary(hash_seconds)
+        counters["queue_wait_ms"] = _summary(wait_seconds)
+        return counters
+
+
+def _summary(seconds):
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.mean(ordered) * 1000, 2),
+        "p50": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    workers=settings.AUTH_HASH_WORKERS,
+                    max_queue=settings.AUTH_HASH_MAX_QUEUE,
+                    queue_timeout=settings.AUTH_HASH_QUEUE_TIMEOUT,
+                )
+    return _pool
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shoptechApp.payments import drain_callback_inbox
+
+
+class Command(BaseCommand):
+    help = "Drain the M-Pesa callback inbox in batches (retries failed rows with backoff)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows claimed per batch")
+        parser.add_argument("--loop", action="store_true", help="Keep polling the inbox instead of exiting when empty")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the inbox is empty (with --loop)")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = drain_callback_inbox(batch_size=options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} callback(s)"))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shoptechApp.sales import recompute_sales_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the best-seller sales rollup from paid orders and re-derive Product.best_seller."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Products upserted per batch")
+        parser.add_argument("--best-sellers", type=int, default=None, help="Products to flag best_seller (default BEST_SELLER_COUNT)")
+        parser.add_argument("--loop", action="store_true", help="Keep recomputing instead of exiting after one run")
+        parser.add_argument("--interval", type=float, default=3600.0, help="Seconds between runs (with --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = recompute_sales_rollup(
+                batch_size=options["batch_size"], best_seller_count=options["best_sellers"]
+            )
+            summary = ", ".join(f"{key}={value}" for key, value in stats.items())
+            self.stdout.write(self.style.SUCCESS(f"Sales rollup recomputed: {summary}"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shoptechApp.mpesa import MpesaError
+from shoptechApp.payments import reconcile_stale_transactions
+
+
+class Command(BaseCommand):
+    help = "Query Daraja for pending M-Pesa transactions whose callback never arrived and settle them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=120, help="Only check transactions older than this many seconds")
+        parser.add_argument("--page-size", type=int, default=100, help="Transactions read per page")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent STK query requests")
+        parser.add_argument("--loop", action="store_true", help="Keep reconciling instead of exiting after one pass")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between passes (with --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                stats = reconcile_stale_transactions(
+                    older_than=options["older_than"],
+                    page_size=options["page_size"],
+                    workers=options["workers"],
+                )
+            except MpesaError as e:
+                if not options["loop"]:
+                    raise CommandError(e.message)
+                # Daraja unavailable: try again on the next pass
+                self.stderr.write(f"Reconciliation failed: {e.message}")
+            else:
+                summary = ", ".join(f"{key}={value}" for key, value in stats.items())
+                self.stdout.write(self.style.SUCCESS(f"Reconciliation finished: {summary}"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
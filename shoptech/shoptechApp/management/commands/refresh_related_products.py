@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shoptechApp.related_products import refresh_related_products
+
+
+class Command(BaseCommand):
+    help = "Recompute the related-products table (shared attributes + co-purchases)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=None, help="Neighbours per product (default RELATED_PRODUCTS_COUNT)")
+        parser.add_argument("--loop", action="store_true", help="Keep refreshing instead of exiting after one run")
+        parser.add_argument("--interval", type=float, default=6 * 3600.0, help="Seconds between runs (with --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            written = refresh_related_products(count=options["count"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Related products refreshed: {written} row(s) in {time.monotonic() - started:.1f}s"
+            ))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
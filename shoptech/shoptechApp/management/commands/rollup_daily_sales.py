@@ -0,0 +1,29 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from shoptechApp.analytics import rollup_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales/payment rollups read by the admin analytics endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=date.fromisoformat, default=None,
+                            help="First day to rebuild, YYYY-MM-DD (default: SALES_ROLLUP_LOOKBACK_DAYS before the latest rolled-up day)")
+        parser.add_argument("--until", type=date.fromisoformat, default=None, help="Last day to rebuild (default today)")
+        parser.add_argument("--loop", action="store_true", help="Keep rolling up instead of exiting after one run")
+        parser.add_argument("--interval", type=float, default=900.0, help="Seconds between runs (with --loop)")
+
+    def handle(self, *args, **options):
+        since, until = options["since"], options["until"]
+        while True:
+            stats = rollup_daily_sales(since=since, until=until)
+            summary = ", ".join(f"{key}={value}" for key, value in stats.items())
+            self.stdout.write(self.style.SUCCESS(f"Daily sales rolled up: {summary}"))
+            if not options["loop"]:
+                break
+            # A backfill runs once; later runs follow the lookback
+            since = until = None
+            time.sleep(options["interval"])
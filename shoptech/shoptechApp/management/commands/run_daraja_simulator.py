@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from shoptechApp.daraja_simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = "Run a local Daraja stand-in (OAuth, STK push, STK query, delayed callbacks)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+        parser.add_argument("--decline-rate", type=float, default=0.0, help="Share of STK pushes the buyer cancels")
+        parser.add_argument("--callback-delay", type=float, default=2.0, help="Seconds between an STK push and its callback")
+        parser.add_argument("--callback-url", default=None, help="Send callbacks here instead of the push's CallBackURL")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        simulator = DarajaSimulator(
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            failure_rate=options["failure_rate"],
+            decline_rate=options["decline_rate"],
+            callback_delay=options["callback_delay"],
+            callback_url=options["callback_url"],
+            seed=options["seed"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Daraja simulator listening on http://{options['host']}:{options['port']} "
+            f"(set MPESA_BASE_URL to this address). Ctrl+C to stop."
+        ))
+        simulator.serve_forever()
+        self.stdout.write(f"Simulator stats: {simulator.stats}")
@@ -0,0 +1,205 @@
+"""
+Project middleware that has to work under both WSGI and ASGI.
+
+A sync-only middleware makes Django hop to a thread for every request under
+ASGI, so each class here implements both call paths.
+"""
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, async-capable.
+
+    Serves ``STATIC_ROOT`` in-process: hashed file names from the manifest
+    storage get far-future immutable cache headers, and the ``.br``/``.gz``
+    variants written by ``collectstatic`` are picked by ``Accept-Encoding``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            response = self.serve(static_file, request)
+            response.streaming_content = _read_chunks(response.file_to_stream, response.block_size)
+            return response
+        return await self.get_response(request)
+
+
+async def _read_chunks(file, block_size):
+    """Stream a file to an ASGI response without blocking the event loop."""
+    if file is None:  # HEAD and 304 responses have no body
+        return
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while chunk := await read(block_size):
+        yield chunk
+
+
+class StreamCompressor:
+    """Incremental brotli or gzip compressor with a common interface."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """Emit everything compressed so far, so streamed chunks reach the client."""
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress(data, encoding):
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header, or ``None``."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    candidates = [("br", accepted.get("br", wildcard))] if brotli is not None else []
+    candidates.append(("gzip", accepted.get("gzip", wildcard)))
+    encoding, quality = max(candidates, key=lambda item: item[1])  # ties keep br first
+    return encoding if quality > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip for JSON API responses.
+
+    Only compresses when the client accepts it, the content type is JSON, and
+    the body is at least ``COMPRESSION_MIN_SIZE`` bytes (smaller bodies gain
+    nothing over the headers' overhead). Media, static files and anything
+    already encoded are left alone. Streaming responses, of unknown size, are
+    compressed chunk by chunk.
+
+    HTML (admin, browsable API), the admin, and any response that used the
+    CSRF token are never compressed: a secret compressed next to attacker-
+    controlled input leaks through the response size (BREACH).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.skip_prefixes = tuple(prefix for prefix in (settings.MEDIA_URL, settings.STATIC_URL) if prefix)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not self._compressible(request, response):
+            return response
+        # Caches must keep one copy per Accept-Encoding even when we skip
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = StreamCompressor(encoding)
+            if response.is_async:
+                response.streaming_content = _compress_async(response.streaming_content, compressor)
+            else:
+                response.streaming_content = _compress_sync(response.streaming_content, compressor)
+            del response["Content-Length"]
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The body changed, so a strong ETag no longer matches it byte for byte
+        etag = response.headers.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def _compressible(self, request, response):
+        if response.has_header("Content-Encoding") or response.has_header("Content-Range"):
+            return False
+        if request.path_info.startswith(self.skip_prefixes):
+            return False
+        if getattr(request.resolver_match, "app_name", None) == "admin" or request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+            return False
+        content_type = response.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        return content_type == "application/json" or content_type.endswith("+json")
+
+
+def _compress_sync(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _compress_async(chunks, compressor):
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoptechApp', '0014_transaction_mpesa_receipt_transaction_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='checkout_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
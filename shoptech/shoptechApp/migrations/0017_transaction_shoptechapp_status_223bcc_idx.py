@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoptechApp', '0016_mpesacallback'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'created_at'], name='shoptechApp_status_223bcc_idx'),
+        ),
+    ]
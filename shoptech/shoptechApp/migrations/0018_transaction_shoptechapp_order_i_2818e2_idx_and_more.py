@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoptechApp', '0017_transaction_shoptechapp_status_223bcc_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['order', 'created_at'], name='shoptechApp_order_i_2818e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['order', 'status'], name='shoptechApp_order_i_8ea949_idx'),
+        ),
+    ]
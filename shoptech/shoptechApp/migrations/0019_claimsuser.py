@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoptechApp', '0018_transaction_shoptechapp_order_i_2818e2_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimsUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('shoptechApp.user',),
+        ),
+    ]
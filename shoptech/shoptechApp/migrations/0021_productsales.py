@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoptechApp', '0020_product_generated_prices_and_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='shoptechApp.product')),
+                ('units_7d', models.PositiveIntegerField(default=0)),
+                ('revenue_7d', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_30d', models.PositiveIntegerField(default=0)),
+                ('revenue_30d', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'product sales',
+                'indexes': [models.Index(fields=['-units_7d', '-revenue_7d'], name='shoptechApp_units_7_5f5eaa_idx'), models.Index(fields=['-units_30d', '-revenue_30d'], name='shoptechApp_units_3_a30139_idx')],
+            },
+        ),
+    ]
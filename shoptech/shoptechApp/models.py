@@ -1,9 +1,11 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.auth.hashers import make_password, verify_password
 from django.db import models
 from datetime import date
 from django.utils import timezone
 from django.conf import settings
 import uuid
+from .hashing import get_hashing_pool
 
 
 
@@ -51,6 +53,20 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    def set_password(self, raw_password):
+        # hashing runs on the bounded auth pool (see hashing.py)
+        self.password = get_hashing_pool().run(make_password, raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = get_hashing_pool().run(verify_password, raw_password, self.password)
+        if is_correct and must_update:
+            # transparently upgrade to the preferred hasher / work factor
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+        return is_correct
+
     def save(self, *args, **kwargs):
         # force all superusers to have admin role
         if self.is_superuser:
@@ -61,6 +77,36 @@ class User(AbstractUser):
         return f"{self.email} ({self.role})"
 
 
+class ClaimsUser(User):
+    """
+    A ``User`` built from JWT claims without a database query.
+
+    Only the fields carried in the token are populated; the first access to
+    any other field loads all of them in one query.
+    """
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, token):
+        claims = {
+            "id": cls._meta.pk.to_python(token["user_id"]),
+            "email": token["email"],
+            "role": token["role"],
+            "is_staff": token["is_staff"],
+            "is_superuser": token["is_superuser"],
+            "is_active": True,  # tokens are only issued to, and revoked for, active users
+        }
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        return cls.from_db("default", field_names, [claims[name] for name in field_names])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
 PRODUCT_GROUPS = [
     ("rings", "Rings"),
     ("necklaces", "Necklaces"),
@@ -71,6 +117,14 @@ PRODUCT_GROUPS = [
 def generate_product_code():
     return "PRD-" + uuid.uuid4().hex[:8].upper()
 
+
+def percentage_off(price, discount_price):
+    """Percentage discount based on price and discount_price."""
+    if price and discount_price and discount_price < price:
+        return float(((price - discount_price) / price) * 100)
+    return 0.0
+
+
 class Product(models.Model):
     product_code = models.CharField(
         max_length=50, unique=True, default=generate_product_code, editable=False
@@ -100,17 +154,85 @@ class Product(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="products"
     )
 
+    # ✅ Computed by the database so listings can sort/filter on them with an index.
+    # What a buyer pays (same rule as the cart: discount_price or price)
+    effective_price = models.GeneratedField(
+        expression=models.Case(
+            models.When(discount_price__gt=0, then=models.F("discount_price")),
+            default=models.F("price"),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    # percentage_off() rounded to 2 places. Not refreshed on the instance after
+    # an update; the API computes the exact value with percentage_off().
+    discount_percentage = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                price__gt=0, discount_price__gt=0, discount_price__lt=models.F("price"),
+                then=(models.F("price") - models.F("discount_price")) * 100 / models.F("price"),
+            ),
+            default=models.Value(0),
+            output_field=models.DecimalField(max_digits=5, decimal_places=2),
+        ),
+        output_field=models.DecimalField(max_digits=5, decimal_places=2),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Sort options of ProductListView (scanned backwards for descending
+            # order). A group filter is only ~1/4 of the catalog, so it's applied
+            # to the same scan rather than given composite indexes.
+            models.Index(fields=["date_posted"]),
+            models.Index(fields=["effective_price"]),
+            models.Index(fields=["discount_percentage"]),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.product_code})"
 
-    @property
-    def discount_percentage(self):
-        """Return percentage discount based on price and discount_price."""
-        if self.price and self.discount_price and self.discount_price < self.price:
-            return float(((self.price - self.discount_price) / self.price) * 100)
-        return 0.0
 
-  
+
+class ProductSales(models.Model):
+    """Units and revenue over rolling windows, behind best-seller ranking (see sales.py)."""
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="sales"
+    )
+    units_7d = models.PositiveIntegerField(default=0)
+    revenue_7d = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_30d = models.PositiveIntegerField(default=0)
+    revenue_30d = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "product sales"
+        indexes = [
+            # /products/best-sellers/ ranking per window
+            models.Index(fields=["-units_7d", "-revenue_7d"]),
+            models.Index(fields=["-units_30d", "-revenue_30d"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.units_30d} sold in 30 days"
+
+
+class RelatedProduct(models.Model):
+    """Precomputed "you may also like" neighbours (see related_products.py)."""
+    # Looked up through the (product, rank) unique index, which is also in rank order
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="related_products", db_index=False
+    )
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="related_to")
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ("product", "rank")
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
 class Cart(models.Model):
     buyer = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -140,7 +262,7 @@ class CartItem(models.Model):
     @property
     def total_price(self):
         """Return discounted price * quantity if discount exists, else normal price."""
-        price = self.product.discounted_price or self.product.price
+        price = self.product.discount_price or self.product.price
         return price * self.quantity
 
 
@@ -150,14 +272,48 @@ class Transaction(models.Model):
     order = models.ForeignKey('Order', on_delete=models.CASCADE, null=True, blank=True, related_name="transactions")
     phone_number = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    checkout_id = models.CharField(max_length=100, unique=True)
-    status = models.CharField(max_length=20, default="pending")  # pending, success, failed
+    # empty while an asynchronous STK push is still being initiated
+    checkout_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, default="pending")  # initiating, pending, success, failed
     result_desc = models.TextField(blank=True, null=True)
     mpesa_receipt = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["order", "created_at"]),
+            models.Index(fields=["order", "status"]),
+        ]
+
     def __str__(self):
         return f"{self.phone_number} - {self.amount} ({self.status})"
+
+
+CALLBACK_STATUS = [
+    ("received", "Received"),
+    ("processed", "Processed"),
+    ("failed", "Failed"),
+]
+
+class MpesaCallback(models.Model):
+    """Raw Daraja callback deliveries, stored as-is and processed by a worker."""
+    payload = models.JSONField()
+    checkout_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    status = models.CharField(max_length=20, choices=CALLBACK_STATUS, default="received")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"Callback {self.checkout_id} ({self.status})"
     
     
 class ContactUs(models.Model):
@@ -186,6 +342,12 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default="pending")
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Orders placed in a date range (sales rollups)
+            models.Index(fields=["created_at"]),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.buyer.email} - {self.status}"
 
@@ -215,6 +377,54 @@ class OrderItem(models.Model):
 
     
 
+class DailySales(models.Model):
+    """Store-wide totals per day, filled by rollup_daily_sales (see analytics.py)."""
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Transactions started that day, by outcome
+    payments_success = models.PositiveIntegerField(default=0)
+    payments_failed = models.PositiveIntegerField(default=0)
+    payments_pending = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "daily sales"
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.revenue}"
+
+    @property
+    def payment_success_rate(self):
+        settled = self.payments_success + self.payments_failed
+        return round(self.payments_success / settled, 4) if settled else None
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "daily product sales"
+        unique_together = ("day", "product")
+
+
+class DailyGroupSales(models.Model):
+    day = models.DateField()
+    group = models.CharField(max_length=50, choices=PRODUCT_GROUPS)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "daily group sales"
+        unique_together = ("day", "group")
+
+
 class CustomerAddress(models.Model):
     COUNTY_CHOICES = [
         ("Kenya", "Kenya"),  # only Kenya allowed
@@ -0,0 +1,195 @@
+"""
+Thin client for the Safaricom Daraja API (OAuth, STK push and STK query).
+
+Views and background workers share these helpers so the request/response
+handling for Daraja lives in one place. ``aget_access_token``, ``astk_push``
+and ``astk_query`` are the async (httpx) versions for async views.
+"""
+import base64
+from datetime import datetime
+
+import httpx
+import requests
+from django.conf import settings
+from requests.auth import HTTPBasicAuth
+
+
+class MpesaError(Exception):
+    """Raised when Daraja rejects a request or returns something unusable."""
+
+    def __init__(self, message, status_code=400, extra=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.extra = extra or {}
+
+    def as_response_data(self):
+        return {"error": self.message, **self.extra}
+
+
+def _token_request():
+    url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
+    return url, (settings.MPESA_CONSUMER_KEY, settings.MPESA_CONSUMER_SECRET)
+
+
+def _parse_token_response(token_response):
+    if token_response.status_code != 200:
+        raise MpesaError(
+            f"Failed to get access token: {token_response.text}",
+            extra={"status_code": token_response.status_code},
+        )
+
+    if not token_response.text.strip():
+        raise MpesaError("Empty response from M-Pesa OAuth endpoint")
+
+    try:
+        token_data = token_response.json()
+    except ValueError:
+        raise MpesaError(f"Invalid JSON response from M-Pesa: {token_response.text}")
+
+    access_token = token_data.get("access_token")
+    if not access_token:
+        raise MpesaError("No access token received")
+    return access_token
+
+
+def get_access_token():
+    """Fetch an OAuth access token using the configured consumer key/secret."""
+    token_url, (key, secret) = _token_request()
+    token_response = requests.get(
+        token_url,
+        auth=HTTPBasicAuth(key, secret),
+        timeout=settings.MPESA_TIMEOUT,
+    )
+    return _parse_token_response(token_response)
+
+
+def stk_password(timestamp):
+    """Daraja password: base64(shortcode + passkey + timestamp)."""
+    data_to_encode = settings.MPESA_SHORTCODE + settings.MPESA_PASSKEY + timestamp
+    return base64.b64encode(data_to_encode.encode()).decode("utf-8")
+
+
+def _auth_headers(access_token):
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+
+
+def _stk_push_request(phone_number, amount, order_id):
+    shortcode = settings.MPESA_SHORTCODE
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    stk_url = f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest"
+    payload = {
+        "BusinessShortCode": shortcode,
+        "Password": stk_password(timestamp),
+        "Timestamp": timestamp,
+        "TransactionType": "CustomerPayBillOnline",
+        "Amount": int(amount),
+        "PartyA": phone_number,
+        "PartyB": shortcode,
+        "PhoneNumber": phone_number,
+        "CallBackURL": settings.MPESA_CALLBACK_URL,
+        "AccountReference": f"Order_{order_id}",
+        "TransactionDesc": f"Payment for Order #{order_id}"
+    }
+    return stk_url, payload
+
+
+def _parse_stk_push_response(stk_response):
+    if stk_response.status_code != 200:
+        raise MpesaError(
+            f"STK Push failed: {stk_response.text}",
+            status_code=stk_response.status_code,
+            extra={"status_code": stk_response.status_code},
+        )
+
+    return stk_response.json()
+
+
+def stk_push(phone_number, amount, order_id):
+    """
+    Send an STK push for an order and return Daraja's JSON response.
+
+    The caller decides what to do with ``ResponseCode``; only transport and
+    HTTP level failures raise ``MpesaError``.
+    """
+    access_token = get_access_token()
+    stk_url, payload = _stk_push_request(phone_number, amount, order_id)
+    stk_response = requests.post(stk_url, json=payload, headers=_auth_headers(access_token), timeout=settings.MPESA_TIMEOUT)
+    return _parse_stk_push_response(stk_response)
+
+
+def _stk_query_request(checkout_id):
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    query_url = f"{settings.MPESA_BASE_URL}/mpesa/stkpushquery/v1/query"
+    payload = {
+        "BusinessShortCode": settings.MPESA_SHORTCODE,
+        "Password": stk_password(timestamp),
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_id,
+    }
+    return query_url, payload
+
+
+def _parse_stk_query_response(response):
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+
+    if response.status_code != 200 or "ResultCode" not in data:
+        raise MpesaError(
+            f"STK Query failed: {data.get('errorMessage') or response.text}",
+            status_code=response.status_code,
+            extra={"error_code": data.get("errorCode")},
+        )
+    return data
+
+
+def stk_query(checkout_id, access_token=None):
+    """
+    Ask Daraja for the outcome of an STK push (``stkpushquery``).
+
+    Returns the JSON body when Daraja has a result; ``ResultCode`` then has
+    the same meaning as in the callback. Daraja answers with an error while
+    the buyer has not responded yet, which raises ``MpesaError``.
+    Pass ``access_token`` to reuse one token across many queries.
+    """
+    access_token = access_token or get_access_token()
+    query_url, payload = _stk_query_request(checkout_id)
+    response = requests.post(query_url, json=payload, headers=_auth_headers(access_token), timeout=settings.MPESA_TIMEOUT)
+    return _parse_stk_query_response(response)
+
+
+# Async client: same requests over httpx, for async views. Transport errors
+# surface as MpesaError (status 500) so callers handle a single exception.
+
+async def _arequest(method, url, **kwargs):
+    try:
+        async with httpx.AsyncClient(timeout=settings.MPESA_TIMEOUT) as client:
+            return await client.request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        raise MpesaError(f"Network error: {e}", status_code=500)
+
+
+async def aget_access_token():
+    token_url, auth = _token_request()
+    return _parse_token_response(await _arequest("GET", token_url, auth=auth))
+
+
+async def astk_push(phone_number, amount, order_id):
+    access_token = await aget_access_token()
+    stk_url, payload = _stk_push_request(phone_number, amount, order_id)
+    response = await _arequest("POST", stk_url, json=payload, headers=_auth_headers(access_token))
+    return _parse_stk_push_response(response)
+
+
+async def astk_query(checkout_id, access_token=None):
+    access_token = access_token or await aget_access_token()
+    query_url, payload = _stk_query_request(checkout_id)
+    response = await _arequest("POST", query_url, json=payload, headers=_auth_headers(access_token))
+    return _parse_stk_query_response(response)
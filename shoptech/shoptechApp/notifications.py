@@ -0,0 +1,109 @@
+"""
+Payment status change notifications for long-polling clients.
+
+Code that changes a transaction calls ``notify_payment_status(order_id)``
+after commit. Waiters in the same process are woken directly. With
+``PAYMENT_STATUS_CHANNEL = "cache"`` (the default when ``REDIS_URL`` is
+set) every notification also bumps a per-order version in the shared
+cache, which waiters check every ``PAYMENT_STATUS_POLL_INTERVAL`` seconds,
+so callbacks applied by another process (a web worker or the callbacks and
+reconcile workers) still wake them (a cache read, not a DB query).
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+_waiters = defaultdict(set)
+_waiters_lock = threading.Lock()
+
+
+def _version_key(order_id):
+    return f"payment-status:{order_id}"
+
+
+def notify_payment_status(order_id):
+    if not order_id:
+        return
+
+    if settings.PAYMENT_STATUS_CHANNEL == "cache":
+        key = _version_key(order_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=settings.PAYMENT_STATUS_WAIT_MAX * 4)
+
+    with _waiters_lock:
+        waiters = list(_waiters.get(order_id, ()))
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # the waiting request's loop has already gone away
+
+
+class PaymentStatusSubscription:
+    """
+    Register interest in an order *before* reading its current status, so a
+    change landing between the read and the wait is not missed::
+
+        async with PaymentStatusSubscription(order_id) as subscription:
+            ...read status...
+            changed = await subscription.wait(timeout)
+    """
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.event = asyncio.Event()
+        self.version = None
+
+    async def __aenter__(self):
+        self._waiter = (asyncio.get_running_loop(), self.event)
+        with _waiters_lock:
+            _waiters[self.order_id].add(self._waiter)
+        if settings.PAYMENT_STATUS_CHANNEL == "cache":
+            self.version = await cache.aget(_version_key(self.order_id))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        with _waiters_lock:
+            waiters = _waiters.get(self.order_id)
+            if waiters is not None:
+                waiters.discard(self._waiter)
+                if not waiters:
+                    del _waiters[self.order_id]
+
+    async def wait(self, timeout):
+        """
+        Return True as soon as a notification arrives, False on timeout.
+        Each call waits for a new notification, so it can be called again
+        after re-reading the status.
+        """
+        if settings.PAYMENT_STATUS_CHANNEL != "cache":
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+            self.event.clear()
+            return True
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(
+                    self.event.wait(), min(settings.PAYMENT_STATUS_POLL_INTERVAL, remaining)
+                )
+            except asyncio.TimeoutError:
+                version = await cache.aget(_version_key(self.order_id))
+                if version != self.version:
+                    self.version = version
+                    return True
+            else:
+                self.event.clear()
+                return True
@@ -0,0 +1,316 @@
+"""
+Payment flow helpers shared by the M-Pesa views and background workers.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import requests
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .models import MpesaCallback, Order, OrderItem, Product, Transaction
+from .mpesa import MpesaError, get_access_token, stk_push, stk_query
+from .notifications import notify_payment_status
+from .product_cache import invalidate_products
+from .sales import PAID_ORDER_STATUSES, record_order_sales
+from .tasks import submit_on_commit
+
+# Once a transaction reaches one of these it is never touched again, which is
+# what makes repeated deliveries of the same callback harmless.
+TERMINAL_STATUSES = ("success", "failed")
+
+
+# STK query result codes that mean "no outcome yet"
+STILL_PROCESSING_RESULT_CODES = ("4999",)
+
+
+class InvalidCallback(Exception):
+    """A stored callback that can never be applied, so is not retried."""
+
+
+def send_stk_push(transaction_id):
+    """
+    Background half of the asynchronous checkout: push the STK prompt for an
+    ``initiating`` transaction and record Daraja's answer on it.
+    """
+    transaction = Transaction.objects.filter(id=transaction_id, status="initiating").first()
+    if transaction is None:
+        return
+
+    try:
+        res_data = stk_push(transaction.phone_number, transaction.amount, transaction.order_id)
+    except MpesaError as e:
+        _mark_push_failed(transaction, e.message)
+        return
+    except requests.exceptions.RequestException as e:
+        _mark_push_failed(transaction, f"Network error: {str(e)}")
+        return
+
+    if res_data.get("ResponseCode") == "0":
+        checkout_id = res_data.get("CheckoutRequestID")
+        # Only if reconcile hasn't given up on the push in the meantime
+        sent = Transaction.objects.filter(id=transaction.id, status="initiating").update(
+            checkout_id=checkout_id, status="pending"
+        )
+        if not sent:
+            # Keep the checkout id so a late callback can still be traced to it
+            Transaction.objects.filter(id=transaction.id, checkout_id__isnull=True).update(checkout_id=checkout_id)
+            print(f"⚠️ STK push for Order #{transaction.order_id} sent after it was abandoned ({checkout_id})")
+            return
+        notify_payment_status(transaction.order_id)
+        print(f"💾 STK push sent for Order #{transaction.order_id}")
+    else:
+        _mark_push_failed(
+            transaction,
+            res_data.get("errorMessage") or res_data.get("ResponseDescription") or "STK Push was rejected",
+        )
+
+
+def _mark_push_failed(transaction, reason):
+    if not Transaction.objects.filter(id=transaction.id, status="initiating").update(
+        status="failed", result_desc=reason
+    ):
+        return
+    notify_payment_status(transaction.order_id)
+    print(f"❌ STK push failed for Order #{transaction.order_id}: {reason}")
+
+
+def parse_stk_callback(data):
+    """Pull the fields we care about out of a Daraja ``stkCallback`` body."""
+    stk_callback = data.get("Body", {}).get("stkCallback", {})
+
+    metadata = {}
+    for item in stk_callback.get("CallbackMetadata", {}).get("Item", []):
+        metadata[item.get("Name")] = item.get("Value")
+
+    return {
+        "checkout_id": stk_callback.get("CheckoutRequestID"),
+        "result_code": stk_callback.get("ResultCode"),
+        "result_desc": stk_callback.get("ResultDesc"),
+        "mpesa_receipt": metadata.get("MpesaReceiptNumber"),
+    }
+
+
+def apply_stk_result(checkout_id, result_code, result_desc, mpesa_receipt=None):
+    """
+    Apply the outcome of an STK push to its transaction, order and stock.
+
+    Safe to call any number of times for the same checkout id: the transaction
+    row is locked first and nothing happens once it is in a terminal state.
+    Every update runs inside one DB transaction using a fixed number of
+    statements, however many items the order has.
+
+    Returns ``(transaction, applied)``; ``transaction`` is ``None`` when the
+    checkout id is unknown and ``applied`` is ``False`` for duplicates.
+    """
+    with db_transaction.atomic():
+        transaction = (
+            Transaction.objects.select_for_update()
+            .filter(checkout_id=checkout_id)
+            .first()
+        )
+        if transaction is None:
+            return None, False
+        if transaction.status in TERMINAL_STATUSES:
+            return transaction, False
+
+        transaction.result_desc = result_desc
+        order_id = transaction.order_id
+        db_transaction.on_commit(lambda: notify_payment_status(order_id))
+
+        if str(result_code) == "0":  # ✅ Payment successful
+            transaction.status = "success"
+            transaction.mpesa_receipt = mpesa_receipt
+            transaction.save(update_fields=["status", "result_desc", "mpesa_receipt"])
+
+            if transaction.order_id:
+                newly_paid = (
+                    Order.objects.filter(id=transaction.order_id)
+                    .exclude(status__in=PAID_ORDER_STATUSES)
+                    .update(status="paid")
+                )
+                _reduce_stock(transaction.order_id)
+                if newly_paid:
+                    # Best-seller rollup, outside the payment transaction
+                    submit_on_commit(record_order_sales, transaction.order_id)
+                print(f"✅ Order {transaction.order_id} marked as PAID with receipt: {mpesa_receipt}")
+
+        else:  # ❌ Payment failed
+            transaction.status = "failed"
+            transaction.save(update_fields=["status", "result_desc"])
+
+            # ✅ Reset order status back to pending
+            if transaction.order_id:
+                Order.objects.filter(id=transaction.order_id).exclude(status="paid").update(status="pending")
+                print(f"❌ Payment failed for Order {transaction.order_id}: {result_desc}")
+
+    return transaction, True
+
+
+def _reduce_stock(order_id):
+    """Decrement stock for every product in the order with a single UPDATE."""
+    quantities = list(
+        OrderItem.objects.filter(order_id=order_id)
+        .values("product_id", "product__product_code")
+        .annotate(quantity=Sum("quantity"))
+    )
+    whens = [
+        When(Q(id=row["product_id"], stock__gte=row["quantity"]), then=F("stock") - row["quantity"])
+        for row in quantities
+    ]
+    if whens:
+        Product.objects.filter(id__in=[row["product_id"] for row in quantities]).update(
+            stock=Case(*whens, default=F("stock"), output_field=PositiveIntegerField())
+        )
+        invalidate_products([row["product__product_code"] for row in quantities])
+
+
+def drain_callback_inbox(batch_size=None):
+    """
+    Process one batch of stored callbacks and return how many rows were handled.
+
+    Rows are claimed with ``SKIP LOCKED`` so several workers can drain the
+    inbox side by side. Each row runs in its own savepoint; a row that fails
+    is rescheduled with exponential backoff and marked ``failed`` once it
+    runs out of attempts, leaving the payload and error for the admin.
+    """
+    batch_size = batch_size or settings.MPESA_CALLBACK_BATCH_SIZE
+    now = timezone.now()
+
+    with db_transaction.atomic():
+        callbacks = list(
+            MpesaCallback.objects.select_for_update(skip_locked=True)
+            .filter(status="received", next_attempt_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+
+        for callback in callbacks:
+            callback.attempts += 1
+            try:
+                with db_transaction.atomic():
+                    _process_callback(callback)
+            except Exception as e:
+                callback.last_error = str(e)
+                if isinstance(e, InvalidCallback) or callback.attempts >= settings.MPESA_CALLBACK_MAX_ATTEMPTS:
+                    callback.status = "failed"
+                else:
+                    delay = settings.MPESA_CALLBACK_RETRY_DELAY * 2 ** (callback.attempts - 1)
+                    callback.next_attempt_at = now + timedelta(seconds=delay)
+                print(f"❌ Callback {callback.id} ({callback.checkout_id}) failed: {callback.last_error}")
+            else:
+                callback.status = "processed"
+                callback.last_error = None
+                callback.processed_at = timezone.now()
+
+        MpesaCallback.objects.bulk_update(
+            callbacks, ["status", "attempts", "last_error", "next_attempt_at", "processed_at"]
+        )
+
+    return len(callbacks)
+
+
+def _process_callback(callback):
+    result = parse_stk_callback(callback.payload)
+    if not result["checkout_id"]:
+        raise InvalidCallback("No CheckoutRequestID in callback")
+
+    transaction, applied = apply_stk_result(**result)
+    if transaction is None:
+        # The callback can beat an asynchronous STK push to saving its
+        # checkout id, so an unknown id is retried rather than dropped.
+        raise ValueError(f"Transaction with CheckoutID {result['checkout_id']} not found")
+    if not applied:
+        print(f"🔁 Duplicate callback for CheckoutID {result['checkout_id']} ignored ({transaction.status})")
+
+
+def reconcile_stale_transactions(older_than, page_size=100, workers=8):
+    """
+    Settle transactions whose callback never arrived by asking Daraja.
+
+    Pending transactions older than ``older_than`` seconds are read in
+    keyset-paginated pages (served by the ``(status, created_at)`` index),
+    queried concurrently with at most ``workers`` requests in flight, and
+    any outcome is applied through ``apply_stk_result`` exactly like a
+    callback. Transactions stuck in ``initiating`` (their STK push was never
+    sent) are failed so the buyer can retry. Returns a dict of counters.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stats = {"checked": 0, "success": 0, "failed": 0, "unresolved": 0, "abandoned": 0}
+
+    abandoned = dict(
+        Transaction.objects.filter(status="initiating", created_at__lte=cutoff).values_list("id", "order_id")
+    )
+    if abandoned:
+        stats["abandoned"] = Transaction.objects.filter(id__in=abandoned, status="initiating").update(
+            status="failed", result_desc="STK push was never sent"
+        )
+        # Wake long-polls the same way a callback does
+        for order_id in set(abandoned.values()):
+            db_transaction.on_commit(partial(notify_payment_status, order_id))
+
+    stale = Transaction.objects.filter(
+        status="pending", created_at__lte=cutoff, checkout_id__isnull=False
+    ).order_by("created_at", "id")
+    if not stale.exists():
+        return stats
+
+    query = partial(_query_stk_outcome, access_token=get_access_token())
+    last_seen = None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stk-query") as pool:
+        while True:
+            page = stale
+            if last_seen is not None:
+                created_at, transaction_id = last_seen
+                page = page.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=transaction_id)
+                )
+            page = list(page.values_list("id", "checkout_id", "created_at")[:page_size])
+            if not page:
+                break
+            last_seen = (page[-1][2], page[-1][0])
+
+            # Only the HTTP calls run on the pool; DB writes stay on this thread
+            outcomes = pool.map(query, [checkout_id for _, checkout_id, _ in page])
+            for (_, checkout_id, _), outcome in zip(page, outcomes):
+                stats["checked"] += 1
+                if outcome is None:
+                    stats["unresolved"] += 1
+                    continue
+                transaction, applied = apply_stk_result(checkout_id, *_reconciled_result(outcome))
+                if applied:
+                    stats[transaction.status] += 1
+
+    return stats
+
+
+def _reconciled_result(outcome):
+    """
+    ``(result_code, result_desc, mpesa_receipt)`` from an STK query response.
+
+    Daraja's query response usually carries no receipt number, so the
+    description records that the outcome came from reconciliation and not
+    from a callback, for support to trace receipt-less payments.
+    """
+    metadata = {
+        item.get("Name"): item.get("Value")
+        for item in outcome.get("CallbackMetadata", {}).get("Item", [])
+    }
+    receipt = outcome.get("MpesaReceiptNumber") or metadata.get("MpesaReceiptNumber")
+    result_desc = f"Reconciled by STK query: {outcome.get('ResultDesc') or 'no description'}"
+    if receipt is None and str(outcome["ResultCode"]) == "0":
+        result_desc += " (no M-Pesa receipt returned)"
+    return outcome["ResultCode"], result_desc, receipt
+
+
+def _query_stk_outcome(checkout_id, access_token):
+    try:
+        data = stk_query(checkout_id, access_token=access_token)
+    except (MpesaError, requests.exceptions.RequestException):
+        return None
+    if str(data["ResultCode"]) in STILL_PROCESSING_RESULT_CODES:
+        return None
+    return data
@@ -0,0 +1,81 @@
+"""
+Per-product cache of catalog rows and stock levels.
+
+Each product's ``.values()`` row (every column ``ProductSerializer``
+reads) is kept under ``product:<product_code>`` for ``PRODUCT_CACHE_TTL``
+seconds, so detail and batch lookups only query the database for misses.
+Its stock level alone is kept under ``stock:<product_code>`` for
+``STOCK_CACHE_TTL`` seconds for availability checks.
+
+Both are dropped when a product is saved or deleted and when a payment
+reduces stock, and refilled from the database on the next read; the TTLs
+bound anything else (queryset ``.update()`` calls, a refill read from a
+lagging replica). Use a shared cache (``REDIS_URL``) so every worker sees
+the invalidation.
+"""
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product
+
+
+@functools.cache
+def _columns():
+    from .serializers import ProductValuesSerializer
+
+    return ProductValuesSerializer().columns
+
+
+def _row_key(product_code):
+    return f"product:{product_code}"
+
+
+def _stock_key(product_code):
+    return f"stock:{product_code}"
+
+
+async def _aget_many(key, product_codes, fetch, timeout):
+    """Cache hits first, then ``fetch(missing_codes)`` for the rest (codes that exist only)."""
+    keys = {key(code): code for code in product_codes}
+    found = {keys[cache_key]: value for cache_key, value in (await cache.aget_many(keys)).items()}
+
+    missing = [code for code in keys.values() if code not in found]
+    if missing:
+        fetched = await fetch(missing)
+        if fetched:
+            await cache.aset_many({key(code): value for code, value in fetched.items()}, timeout=timeout)
+        found.update(fetched)
+    return found
+
+
+async def _fetch_rows(product_codes):
+    queryset = Product.objects.filter(product_code__in=product_codes).values(*_columns())
+    return {row["product_code"]: row async for row in queryset}
+
+
+async def _fetch_stock(product_codes):
+    queryset = Product.objects.filter(product_code__in=product_codes).values_list("product_code", "stock")
+    return {code: stock async for code, stock in queryset}
+
+
+async def aget_product_rows(product_codes):
+    """
+    ``{product_code: row}`` for the codes that exist, cache hits first and
+    all misses in one ``product_code__in`` query.
+    """
+    return await _aget_many(_row_key, product_codes, _fetch_rows, settings.PRODUCT_CACHE_TTL)
+
+
+async def aget_stock_levels(product_codes):
+    """``{product_code: stock}`` for the codes that exist, like ``aget_product_rows``."""
+    return await _aget_many(_stock_key, product_codes, _fetch_stock, settings.STOCK_CACHE_TTL)
+
+
+def invalidate_products(product_codes):
+    """Drop the cached rows and stock levels once the current transaction commits."""
+    keys = [key(code) for code in product_codes for key in (_row_key, _stock_key)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
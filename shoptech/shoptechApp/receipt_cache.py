@@ -0,0 +1,41 @@
+"""
+Cache of paid order receipts (``orders/<id>/success/``).
+
+A receipt is kept under ``order-receipt:<buyer_id>:<order_id>`` for
+``ORDER_RECEIPT_CACHE_TTL`` seconds. It is dropped when the order, one of
+its items or transactions, or a product on it is saved, so the cached
+payload always matches what the view would build from the database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import OrderItem
+
+
+def receipt_key(buyer_id, order_id):
+    return f"order-receipt:{buyer_id}:{order_id}"
+
+
+def get_receipt(buyer_id, order_id):
+    return cache.get(receipt_key(buyer_id, order_id))
+
+
+def set_receipt(buyer_id, order_id, receipt):
+    cache.set(receipt_key(buyer_id, order_id), receipt, settings.ORDER_RECEIPT_CACHE_TTL)
+
+
+def invalidate_receipts(orders):
+    """Drop the receipts of these ``(buyer_id, order_id)`` pairs once the current transaction commits."""
+    keys = [receipt_key(buyer_id, order_id) for buyer_id, order_id in orders]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_product_receipts(product_id):
+    """Drop the receipts of paid orders listing this product (its name or code may have changed)."""
+    invalidate_receipts(
+        OrderItem.objects.filter(product_id=product_id, order__status="paid")
+        .values_list("order__buyer_id", "order_id")
+        .distinct()
+    )
@@ -0,0 +1,99 @@
+"""
+Precomputed related products ("you may also like").
+
+``refresh_related_products`` (``manage.py refresh_related_products``, run
+periodically) scores neighbours for every product and replaces the
+``RelatedProduct`` table, keeping the top ``RELATED_PRODUCTS_COUNT`` per
+product in rank order. Scores add up shared attributes (collection, group,
+color) and how many paid orders contained both products. Candidates come
+from the newest products sharing an attribute plus every co-purchased
+product, so the job stays linear in the catalog size.
+"""
+from collections import defaultdict
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import OrderItem, Product, RelatedProduct
+from .sales import PAID_ORDER_STATUSES
+
+SAME_COLLECTION = 3
+SAME_GROUP = 2
+SAME_COLOR = 1
+PER_CO_PURCHASE = 2
+
+
+def co_purchase_counts():
+    """``{product_id: {other_product_id: paid orders containing both}}``."""
+    pairs = (
+        OrderItem.objects.filter(order__status__in=PAID_ORDER_STATUSES)
+        .annotate(other_id=F("order__items__product_id"))
+        .exclude(other_id=F("product_id"))
+        .values("product_id", "other_id")
+        .annotate(orders=Count("order_id", distinct=True))
+        .order_by()
+    )
+    counts = defaultdict(dict)
+    for row in pairs.iterator(chunk_size=2000):
+        counts[row["product_id"]][row["other_id"]] = row["orders"]
+    return counts
+
+
+def compute_related_products(count=None, candidates_per_bucket=None):
+    """``{product_id: [related_id, ...]}`` best first, at most ``count`` each."""
+    count = count or settings.RELATED_PRODUCTS_COUNT
+    per_bucket = candidates_per_bucket or count * 3
+
+    products = list(
+        Product.objects.order_by("-date_posted", "-id").values_list("id", "group", "collection", "color")
+    )
+    newest = {product_id: position for position, (product_id, *_) in enumerate(products)}
+    attributes = {product_id: rest for product_id, *rest in products}
+
+    # Newest-first members of each attribute bucket, truncated to what's ever read
+    buckets = defaultdict(list)
+    for product_id, group, collection, color in products:
+        keys = [("group", group), ("group_color", group, color) if color else None,
+                ("collection", collection) if collection else None]
+        for key in filter(None, keys):
+            if len(buckets[key]) < per_bucket + 1:
+                buckets[key].append(product_id)
+
+    co_purchases = co_purchase_counts()
+    related = {}
+    for product_id, group, collection, color in products:
+        bought_with = co_purchases.get(product_id, {})
+        candidates = set(bought_with)
+        for key in (("collection", collection), ("group_color", group, color), ("group", group)):
+            candidates.update(buckets.get(key, ()))
+        candidates.discard(product_id)
+
+        def score(other):
+            other_group, other_collection, other_color = attributes[other]
+            return (
+                SAME_COLLECTION * bool(collection and collection == other_collection)
+                + SAME_GROUP * (group == other_group)
+                + SAME_COLOR * bool(color and color == other_color)
+                + PER_CO_PURCHASE * bought_with.get(other, 0),
+                bought_with.get(other, 0),
+                -newest[other],
+            )
+
+        related[product_id] = heapq.nlargest(count, candidates, key=score)
+    return related
+
+
+def refresh_related_products(count=None, batch_size=1000):
+    """Recompute and replace the whole ``RelatedProduct`` table; returns rows written."""
+    related = compute_related_products(count)
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=other, rank=rank)
+        for product_id, others in related.items()
+        for rank, other in enumerate(others, start=1)
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
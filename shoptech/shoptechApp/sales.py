@@ -0,0 +1,143 @@
+"""
+Sales rollup behind best-seller ranking.
+
+``ProductSales`` keeps units and revenue per product over rolling windows.
+Paid orders are added incrementally, one upsert per order queued after the
+payment commits, so nothing reads ``OrderItem`` to rank products.
+
+Increments never expire, and one can be lost if the process dies before
+it runs, so ``recompute_sales_rollup`` (``manage.py recompute_sales_rollup``,
+run periodically) rebuilds every window from paid orders in batches. It
+also ages sales out of the windows and re-derives ``Product.best_seller``
+from the 30-day ranking.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateTimeField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, ProductSales, Transaction
+from .product_cache import invalidate_products
+
+# Window name -> days; ProductSales has units_<name>/revenue_<name> for each
+SALES_WINDOWS = {"7d": 7, "30d": 30}
+PAID_ORDER_STATUSES = ("paid", "shipped", "delivered")
+
+
+def _rollup_columns():
+    return [f"{kind}_{window}" for window in SALES_WINDOWS for kind in ("units", "revenue")]
+
+
+def record_order_sales(order_id):
+    """Add a newly paid order's items to every window with a single upsert."""
+    sales, items = ProductSales._meta.db_table, OrderItem._meta.db_table
+    columns = _rollup_columns()
+    totals = ", ".join(
+        "SUM(quantity)" if column.startswith("units_") else "SUM(price * quantity)" for column in columns
+    )
+    increments = ", ".join(f'{column} = "{sales}".{column} + EXCLUDED.{column}' for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{sales}" (product_id, {", ".join(columns)}, updated_at) '
+            f'SELECT product_id, {totals}, NOW() FROM "{items}" WHERE order_id = %s GROUP BY product_id '
+            f"ON CONFLICT (product_id) DO UPDATE SET {increments}, updated_at = EXCLUDED.updated_at",
+            [order_id],
+        )
+
+
+def paid_items(since, until=None):
+    """
+    ``OrderItem``s of paid orders, annotated with ``paid_at``, paid in
+    ``[since, until)``.
+
+    An order counts as paid when its first successful transaction started
+    (orders marked paid by hand fall back to when they were placed), so
+    only orders placed or successfully charged in the range can match;
+    both are narrowed by index before ``paid_at`` is computed.
+    """
+    in_range = {"created_at__gte": since, **({"created_at__lt": until} if until else {})}
+    charged = Transaction.objects.filter(status="success", **in_range).values("order_id")
+    paid_at = Subquery(
+        Transaction.objects.filter(order_id=OuterRef("order_id"), status="success")
+        .order_by("created_at")
+        .values("created_at")[:1]
+    )
+    items = (
+        OrderItem.objects.filter(order__status__in=PAID_ORDER_STATUSES)
+        .filter(Q(order_id__in=Order.objects.filter(**in_range).values("id")) | Q(order_id__in=charged))
+        .annotate(paid_at=Coalesce(paid_at, F("order__created_at"), output_field=DateTimeField()))
+        .filter(paid_at__gte=since)
+    )
+    return items.filter(paid_at__lt=until) if until else items
+
+
+def recompute_sales_rollup(batch_size=500, best_seller_count=None):
+    """
+    Rebuild ``ProductSales`` from paid orders and re-derive ``best_seller``.
+
+    Totals are streamed and upserted ``batch_size`` rows at a time; rows
+    not touched (no sales left in any window) are zeroed. Returns a dict of
+    counters.
+    """
+    if best_seller_count is None:
+        best_seller_count = settings.BEST_SELLER_COUNT
+    now = timezone.now()
+    totals = {}
+    for window, days in SALES_WINDOWS.items():
+        in_window = Q(paid_at__gte=now - timedelta(days=days))
+        totals[f"units_{window}"] = Sum("quantity", filter=in_window, default=0)
+        totals[f"revenue_{window}"] = Sum(F("price") * F("quantity"), filter=in_window, default=Decimal(0))
+    rows = (
+        paid_items(now - timedelta(days=max(SALES_WINDOWS.values())))
+        .values("product_id")
+        .annotate(**totals)
+        .order_by()
+    )
+
+    stats = {"products": 0, "zeroed": 0, "best_sellers": 0}
+    with transaction.atomic():
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(ProductSales(updated_at=now, **row))
+            if len(batch) == batch_size:
+                stats["products"] += _upsert(batch)
+                batch = []
+        stats["products"] += _upsert(batch)
+
+        # Anything older than this run has no sales left in any window
+        stats["zeroed"] = ProductSales.objects.filter(updated_at__lt=now).update(
+            updated_at=now, **{column: 0 for column in _rollup_columns()}
+        )
+        stats["best_sellers"] = _mark_best_sellers(best_seller_count)
+    return stats
+
+
+def _upsert(batch):
+    if batch:
+        ProductSales.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=[*_rollup_columns(), "updated_at"],
+        )
+    return len(batch)
+
+
+def _mark_best_sellers(count):
+    top = list(
+        ProductSales.objects.filter(units_30d__gt=0)
+        .order_by("-units_30d", "-revenue_30d")
+        .values_list("product_id", flat=True)[:count]
+    )
+    changed = Product.objects.filter(
+        Q(best_seller=True) & ~Q(id__in=top) | Q(best_seller=False, id__in=top)
+    )
+    codes = list(changed.values_list("product_code", flat=True))
+    Product.objects.filter(best_seller=True).exclude(id__in=top).update(best_seller=False)
+    Product.objects.filter(id__in=top, best_seller=False).update(best_seller=True)
+    invalidate_products(codes)
+    return len(top)
@@ -1,8 +1,18 @@
+import functools
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.encoding import filepath_to_uri
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
+from django.utils.translation import gettext_lazy as _
+from .authentication import add_user_claims, tokens_for_user
 from .models import *
 
 
@@ -69,7 +79,7 @@ class LoginSerializer(serializers.Serializer):
     def create(self, validated_data):
         """Return tokens for the logged-in user"""
         user = validated_data["user"]
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
 
         return {
             "refresh": str(refresh),
@@ -83,6 +93,29 @@ class LoginSerializer(serializers.Serializer):
         }
         
 
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """token/ issues the same user claims as login/"""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-stamp the user claims on refresh so role/staff changes are picked up."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.filter(**{
+            jwt_settings.USER_ID_FIELD: refresh.get(jwt_settings.USER_ID_CLAIM)
+        }).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        attrs["refresh"] = str(add_user_claims(refresh, user))
+        return super().validate(attrs)
+        
+
 class ProductSerializer(serializers.ModelSerializer):
     image1 = serializers.SerializerMethodField()
     image2 = serializers.SerializerMethodField()
@@ -124,11 +157,221 @@ class ProductSerializer(serializers.ModelSerializer):
         return None
 
     def get_discount_percentage(self, obj):
-        return obj.discount_percentage
+        return percentage_off(obj.price, obj.discount_price)
+
+
+class FieldSelection:
+    """
+    ``?fields=`` / ``?exclude=`` as trees of field names.
+
+    ``fields=id,items.quantity,items.product.name`` keeps ``id`` and only the
+    named fields of the nested items; ``exclude=created_at,items.product``
+    drops fields. Names are comma-separated, nesting is dotted, unknown names
+    are ignored.
+    """
+
+    def __init__(self, fields=None, exclude=None):
+        self.include = self._tree(fields) if isinstance(fields, str) else fields
+        self.exclude = (self._tree(exclude) if isinstance(exclude, str) else exclude) or {}
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(request.GET.get("fields"), request.GET.get("exclude"))
+
+    @staticmethod
+    def _tree(value):
+        tree = {}
+        for path in value.split(","):
+            node = tree
+            for name in filter(None, (part.strip() for part in path.split("."))):
+                node = node.setdefault(name, {})
+        return tree or None
+
+    def __bool__(self):
+        return self.include is not None or bool(self.exclude)
+
+    def keep(self, name):
+        if self.include is not None and name not in self.include:
+            return False
+        # {} marks a leaf, i.e. the whole field is excluded
+        return self.exclude.get(name) != {}
+
+    def filter(self, names):
+        return [name for name in names if self.keep(name)]
+
+    def child(self, name):
+        """Selection for the fields of nested field ``name``."""
+        include = self.include.get(name) or None if self.include is not None else None
+        return FieldSelection(include, self.exclude.get(name))
+
+
+class SparseFieldsMixin:
+    """
+    Drops the fields not selected by the ``FieldSelection`` in
+    ``context["fields"]``; nested serializers get their part of it.
+
+    ``field_columns`` names the model columns behind fields that aren't plain
+    model fields (method fields, properties), so ``sparse_queryset`` can
+    narrow the query; other such fields load every column.
+    """
+
+    field_columns = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.field_selection
+        if selection:
+            for name in [name for name, field in fields.items() if not field.write_only]:
+                if not selection.keep(name):
+                    del fields[name]
+        return fields
+
+    @property
+    def field_selection(self):
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        selection = self.context.get("fields") or FieldSelection()
+        for name in reversed(path):
+            selection = selection.child(name)
+        return selection
+
+
+def _column_plan(serializer, model, prefix=""):
+    """(only() paths, Prefetch objects) for the readable fields of ``serializer``."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    field_columns = getattr(serializer, "field_columns", {})
+    only, prefetch = [], []
+    all_columns = [prefix + field.name for field in model._meta.concrete_fields]
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in field_columns:
+            only += [prefix + column for column in field_columns[name]]
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            # A property or method field we know nothing about
+            only += all_columns
+            continue
+
+        if isinstance(field, serializers.ListSerializer) and model_field.one_to_many:
+            related_only, related_prefetch = _column_plan(field, model_field.related_model)
+            queryset = _apply_plan(
+                model_field.related_model._default_manager.all(),
+                related_only + [model_field.field.name], related_prefetch,
+            )
+            prefetch.append(Prefetch(prefix + field.source, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer) and model_field.concrete and model_field.is_relation:
+            related_only, related_prefetch = _column_plan(
+                field, model_field.related_model, f"{prefix}{field.source}__"
+            )
+            only += [prefix + field.source] + related_only
+            prefetch += related_prefetch
+        elif isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            only += [prefix + field.source] + [
+                f"{prefix}{field.source}__{column.name}" for column in model_field.related_model._meta.concrete_fields
+            ]
+        elif model_field.concrete:
+            only.append(prefix + field.source)
+        else:
+            only += all_columns
+    return only, prefetch
+
+
+def _apply_plan(queryset, only, prefetch):
+    related = {path.rsplit("__", 1)[0] for path in only if "__" in path}
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*dict.fromkeys(only)).prefetch_related(*prefetch)
+
+
+def sparse_queryset(queryset, serializer):
+    """
+    Narrow ``queryset`` to what ``serializer`` (after its field selection)
+    reads: ``only()`` the needed columns, ``select_related`` nested objects
+    and prefetch nested lists with the same treatment.
+    """
+    return _apply_plan(queryset, *_column_plan(serializer, queryset.model))
+
+
+def sparse_prefetch(instances, serializer):
+    """``sparse_queryset`` for instances that are already loaded: prefetch their nested lists."""
+    model = type(instances[0])
+    prefetch_related_objects(instances, *_column_plan(serializer, model)[1])
+
+
+@functools.cache
+def _product_serializer_fields():
+    return dict(ProductSerializer().fields)
+
+
+def _none_or(convert):
+    return lambda value: None if value is None else convert(value)
+
+
+class ProductValuesSerializer:
+    """
+    Read-only fast path producing exactly ``ProductSerializer``'s output.
+
+    Works on ``.values(*serializer.columns)`` rows instead of model
+    instances and builds each dict with conversions bound once per request,
+    skipping DRF's per-field machinery. Use ``ProductSerializer`` for writes
+    and anything that needs validation.
+    """
+
+    IMAGE_FIELDS = ("image1", "image2", "image3", "image4")
+
+    def __init__(self, request=None, fields=None):
+        self.fields = [f for f in ProductSerializer.Meta.fields if fields is None or f in fields]
+        columns = set(self.fields) - {"discount_percentage"}
+        if "discount_percentage" in self.fields:
+            columns |= {"price", "discount_price"}
+        # .values() with no columns would fetch them all
+        self.columns = [f for f in ProductSerializer.Meta.fields if f in columns] or ["pk"]
+
+        storage = Product._meta.get_field("image1").storage
+        if request is None:
+            def image(name):
+                return None
+        elif isinstance(storage, FileSystemStorage):
+            # Same URL as request.build_absolute_uri(storage.url(name)), with the
+            # absolute media prefix resolved once instead of once per image
+            base = request.build_absolute_uri(storage.base_url)
+
+            def image(name):
+                return base + filepath_to_uri(name).lstrip("/") if name else None
+        else:
+            def image(name):
+                return request.build_absolute_uri(storage.url(name)) if name else None
+
+        converters = {name: image for name in self.IMAGE_FIELDS}
+        for name, field in _product_serializer_fields().items():
+            if isinstance(field, (serializers.DecimalField, serializers.DateTimeField)):
+                converters[name] = _none_or(field.to_representation)
+        self._steps = [(name, converters.get(name)) for name in self.fields]
+
+    def to_representation(self, row):
+        data = {}
+        for name, convert in self._steps:
+            if name == "discount_percentage":
+                data[name] = percentage_off(row["price"], row["discount_price"])
+            elif convert is None:
+                data[name] = row[name]
+            else:
+                data[name] = convert(row[name])
+        return data
 
     
-class ProductMiniSerializer(serializers.ModelSerializer):
+class ProductMiniSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image1 = serializers.SerializerMethodField()
+    field_columns = {"image1": ["image1"]}
+
     class Meta:
         model = Product
         fields = ["id", "name", "price", "discount_price", "stock", "image1"]
@@ -141,18 +384,19 @@ class ProductMiniSerializer(serializers.ModelSerializer):
 
     
     
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductMiniSerializer(read_only=True)
     product_code = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product", write_only=True
     )
+    field_columns = {"total_price": ["quantity", "product__price", "product__discount_price"]}
 
     class Meta:
         model = CartItem
         fields = ["id", "product", "product_code", "quantity", "total_price"]
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -180,17 +424,19 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "county",
         ]
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductMiniSerializer(read_only=True)
+    field_columns = {"total_price": ["price", "quantity"]}
 
     class Meta:
         model = OrderItem
         fields = ["id", "product", "quantity", "price", "total_price"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     buyer = serializers.StringRelatedField(read_only=True)
+    field_columns = {"buyer": ["buyer__email", "buyer__role"]}
 
     class Meta:
         model = Order
@@ -215,3 +461,40 @@ class CustomerAddressSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["buyer", "created_at"]
 
+
+
+# Admin analytics, read from the daily rollups (see analytics.py)
+class SalesTotalsSerializer(serializers.ModelSerializer):
+    payment_success_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DailySales
+        fields = [
+            "orders",
+            "units",
+            "revenue",
+            "payments_success",
+            "payments_failed",
+            "payments_pending",
+            "payment_success_rate",
+        ]
+
+
+class DailySalesSerializer(SalesTotalsSerializer):
+    class Meta(SalesTotalsSerializer.Meta):
+        fields = ["day", *SalesTotalsSerializer.Meta.fields]
+
+
+class ProductSalesTotalsSerializer(serializers.Serializer):
+    product_code = serializers.CharField()
+    name = serializers.CharField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class GroupSalesTotalsSerializer(serializers.Serializer):
+    group = serializers.CharField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import USER_CLAIMS, revoke_user_tokens
+from .models import ClaimsUser, Order, OrderItem, Product, Transaction
+from .product_cache import invalidate_products
+from .receipt_cache import invalidate_product_receipts, invalidate_receipts
+
+User = get_user_model()
+
+# Fields baked into access tokens (see authentication.py)
+TOKEN_FIELDS = ("is_active", *USER_CLAIMS)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ClaimsUser)
+def revoke_tokens_on_claim_change(sender, instance, update_fields=None, **kwargs):
+    """Deactivation or a role/staff/email change revokes tokens carrying the old claims."""
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(TOKEN_FIELDS):
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*TOKEN_FIELDS).first()
+    if previous and any(previous[field] != getattr(instance, field) for field in TOKEN_FIELDS):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def drop_cached_product(sender, instance, **kwargs):
+    invalidate_products([instance.product_code])
+
+
+@receiver(post_save, sender=Product)
+def drop_receipts_listing_product(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_product_receipts(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def drop_cached_receipt(sender, instance, **kwargs):
+    invalidate_receipts([(instance.buyer_id, instance.pk)])
+
+
+@receiver(post_save, sender=Transaction)
+def drop_receipt_of_paid_order(sender, instance, **kwargs):
+    if instance.order_id:
+        invalidate_receipts([(instance.buyer_id, instance.order_id)])
+
+
+@receiver(post_save, sender=OrderItem)
+def drop_receipt_listing_item(sender, instance, created, **kwargs):
+    # New items only go on orders still being placed, which have no receipt yet
+    if not created:
+        invalidate_receipts([(instance.order.buyer_id, instance.order_id)])
@@ -0,0 +1,16 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Hashed, precompressed static files (see StaticFilesMiddleware).
+
+    Files collectstatic hasn't processed (local runs with DEBUG off, tests)
+    keep their plain URL instead of failing every ``{% static %}``.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -0,0 +1,49 @@
+"""
+In-process background work.
+
+Slow side effects (Daraja round trips and the like) are handed to a small
+thread pool so the request that triggered them can return straight away.
+Set ``BACKGROUND_TASKS_EAGER = True`` to run tasks inline (tests, scripts).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_WORKERS,
+                    thread_name_prefix="shoptech-bg",
+                )
+    return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        print(f"🔥 Background task {fn.__name__} failed: {str(e)}")
+    finally:
+        # Worker threads own their DB connections; don't leak them.
+        connections.close_all()
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn`` on the background pool (or inline when eager)."""
+    if settings.BACKGROUND_TASKS_EAGER:
+        return fn(*args, **kwargs)
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+
+def submit_on_commit(fn, *args, **kwargs):
+    """Queue ``fn`` once the surrounding DB transaction commits."""
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
@@ -1,3 +1,1425 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO, StringIO
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import requests
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .analytics import rollup_daily_sales
+from .authentication import tokens_for_user
+from .daraja_simulator import DarajaSimulator
+from .db_routers import replica_reads
+from .hashing import HashingPool, HashPoolBusy
+from .middleware import CompressionMiddleware
+from .mpesa import MpesaError, stk_push, stk_query
+from .notifications import notify_payment_status
+from .renderers import ORJSONParser, ORJSONRenderer
+from .models import *
+from .payments import (
+    apply_stk_result, drain_callback_inbox, parse_stk_callback, reconcile_stale_transactions, send_stk_push,
+)
+from .related_products import refresh_related_products
+from .sales import record_order_sales, recompute_sales_rollup
+from .serializers import FieldSelection, OrderSerializer, ProductSerializer, ProductValuesSerializer
+
+
+def stk_callback_payload(checkout_id, result_code=0, receipt="RCP123"):
+    payload = {
+        "Body": {
+            "stkCallback": {
+                "MerchantRequestID": "29115-34620561-1",
+                "CheckoutRequestID": checkout_id,
+                "ResultCode": result_code,
+                "ResultDesc": "The service request is processed successfully." if result_code == 0 else "Request cancelled by user",
+            }
+        }
+    }
+    if result_code == 0:
+        payload["Body"]["stkCallback"]["CallbackMetadata"] = {
+            "Item": [
+                {"Name": "Amount", "Value": 1500},
+                {"Name": "MpesaReceiptNumber", "Value": receipt},
+                {"Name": "TransactionDate", "Value": 20250927172100},
+                {"Name": "PhoneNumber", "Value": 254700000000},
+            ]
+        }
+    return payload
+
+
+class PaymentFixturesMixin:
+    def create_paid_order_fixture(self, checkout_id="ws_CO_TEST_1"):
+        self.buyer = User.objects.create_user(
+            email="buyer@example.com", password="s3cure-Passw0rd", username="buyer"
+        )
+        self.ring = Product.objects.create(
+            name="Infinity Loop Ring", price=1000, stock=5, image1="products/rings.png", posted_by=self.buyer
+        )
+        self.bangle = Product.objects.create(
+            name="Gold Bangle", price=500, stock=1, image1="products/rings.png", posted_by=self.buyer
+        )
+        self.order = Order.objects.create(buyer=self.buyer, total_price=1500)
+        OrderItem.objects.create(order=self.order, product=self.ring, quantity=1, price=1000)
+        OrderItem.objects.create(order=self.order, product=self.bangle, quantity=1, price=500)
+        self.transaction = Transaction.objects.create(
+            buyer=self.buyer,
+            order=self.order,
+            phone_number="254700000000",
+            amount=1500,
+            checkout_id=checkout_id,
+            status="pending",
+        )
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class MpesaCallbackTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+
+    def post_callback(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/mpesa/callback/", payload, content_type="application/json")
+
+    def test_success_marks_order_paid_and_reduces_stock(self):
+        response = self.post_callback(stk_callback_payload("ws_CO_TEST_1"))
+
+        self.assertEqual(response.json()["ResultCode"], 0)
+        self.transaction.refresh_from_db()
+        self.order.refresh_from_db()
+        self.ring.refresh_from_db()
+        self.bangle.refresh_from_db()
+        self.assertEqual(self.transaction.status, "success")
+        self.assertEqual(self.transaction.mpesa_receipt, "RCP123")
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.ring.stock, 4)
+        self.assertEqual(self.bangle.stock, 0)
+
+    def test_duplicate_callback_is_ignored(self):
+        self.post_callback(stk_callback_payload("ws_CO_TEST_1"))
+        self.post_callback(stk_callback_payload("ws_CO_TEST_1", receipt="RCP999"))
+
+        self.transaction.refresh_from_db()
+        self.ring.refresh_from_db()
+        self.assertEqual(self.transaction.mpesa_receipt, "RCP123")
+        self.assertEqual(self.ring.stock, 4)
+
+    def test_late_failure_does_not_undo_success(self):
+        self.post_callback(stk_callback_payload("ws_CO_TEST_1"))
+        self.post_callback(stk_callback_payload("ws_CO_TEST_1", result_code=1032))
+
+        self.transaction.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.transaction.status, "success")
+        self.assertEqual(self.order.status, "paid")
+
+    def test_failed_payment_keeps_stock(self):
+        self.post_callback(stk_callback_payload("ws_CO_TEST_1", result_code=1032))
+
+        self.transaction.refresh_from_db()
+        self.order.refresh_from_db()
+        self.ring.refresh_from_db()
+        self.assertEqual(self.transaction.status, "failed")
+        self.assertEqual(self.order.status, "pending")
+        self.assertEqual(self.ring.stock, 5)
+
+    def test_success_uses_fixed_number_of_queries(self):
+        for i in range(5):
+            product = Product.objects.create(
+                name=f"Extra {i}", price=100, stock=3, image1="products/rings.png", posted_by=self.buyer
+            )
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, price=100)
+
+        # select_for_update, transaction, order, item quantities, stock
+        # (plus the savepoint pair inside the test case's transaction)
+        with self.assertNumQueries(7):
+            apply_stk_result("ws_CO_TEST_1", 0, "Processed", "RCP123")
+
+    def test_unknown_checkout_id_is_acknowledged(self):
+        response = self.post_callback(stk_callback_payload("ws_CO_UNKNOWN"))
+        self.assertEqual(response.json()["ResultCode"], 0)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ConcurrentMpesaCallbackTests(PaymentFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+
+    def test_concurrent_duplicate_callbacks_apply_once(self):
+        workers = 8
+        barrier = threading.Barrier(workers)
+        responses = []
+
+        def deliver():
+            try:
+                barrier.wait()
+                response = Client().post(
+                    "/mpesa/callback/",
+                    stk_callback_payload("ws_CO_TEST_1"),
+                    content_type="application/json",
+                )
+                responses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=deliver) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(responses, [200] * workers)
+        self.ring.refresh_from_db()
+        self.bangle.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.ring.stock, 4)
+        self.assertEqual(self.bangle.stock, 0)
+        self.assertEqual(self.order.status, "paid")
+
+
+@override_settings(MPESA_CALLBACK_MAX_ATTEMPTS=2)
+class MpesaCallbackInboxTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+
+    def test_callback_is_stored_and_acknowledged_with_one_insert(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                "/mpesa/callback/", stk_callback_payload("ws_CO_TEST_1"), content_type="application/json"
+            )
+
+        self.assertEqual(response.json()["ResultCode"], 0)
+        callback = MpesaCallback.objects.get()
+        self.assertEqual(callback.checkout_id, "ws_CO_TEST_1")
+        self.assertEqual(callback.status, "received")
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, "pending")
+
+    def test_drain_processes_batch(self):
+        MpesaCallback.objects.create(payload=stk_callback_payload("ws_CO_TEST_1"), checkout_id="ws_CO_TEST_1")
+        MpesaCallback.objects.create(payload=stk_callback_payload("ws_CO_TEST_1"), checkout_id="ws_CO_TEST_1")
+
+        self.assertEqual(drain_callback_inbox(), 2)
+
+        self.assertEqual(MpesaCallback.objects.filter(status="processed").count(), 2)
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.stock, 4)
+
+    def test_unknown_checkout_id_is_retried_then_failed(self):
+        callback = MpesaCallback.objects.create(
+            payload=stk_callback_payload("ws_CO_LATE"), checkout_id="ws_CO_LATE"
+        )
+
+        drain_callback_inbox()
+        callback.refresh_from_db()
+        self.assertEqual(callback.status, "received")
+        self.assertEqual(callback.attempts, 1)
+        self.assertIn("not found", callback.last_error)
+        self.assertGreater(callback.next_attempt_at, timezone.now())
+
+        MpesaCallback.objects.filter(id=callback.id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        call_command("process_mpesa_callbacks", stdout=StringIO())
+        callback.refresh_from_db()
+        self.assertEqual(callback.status, "failed")
+        self.assertEqual(callback.attempts, 2)
+
+    def test_callback_without_checkout_id_fails_immediately(self):
+        callback = MpesaCallback.objects.create(payload={"Body": {}})
+
+        drain_callback_inbox()
+        callback.refresh_from_db()
+        self.assertEqual(callback.status, "failed")
+
+
+class ReconcileStaleTransactionsTests(PaymentFixturesMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.daraja = DarajaSimulator().start()
+        cls.addClassCleanup(cls.daraja.stop)
+
+    def setUp(self):
+        self.create_paid_order_fixture()
+        self.settings_override = override_settings(MPESA_BASE_URL=self.daraja.base_url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def make_stale(self, *transactions):
+        Transaction.objects.filter(id__in=[t.id for t in transactions]).update(
+            created_at=timezone.now() - timedelta(minutes=10)
+        )
+
+    def create_transaction(self, checkout_id, status="pending"):
+        order = Order.objects.create(buyer=self.buyer, total_price=1000)
+        OrderItem.objects.create(order=order, product=self.ring, quantity=1, price=1000)
+        return Transaction.objects.create(
+            buyer=self.buyer, order=order, phone_number="254700000000",
+            amount=1000, checkout_id=checkout_id, status=status,
+        )
+
+    def test_applies_outcomes_from_stk_query(self):
+        cancelled = self.create_transaction("ws_CO_TEST_2")
+        unanswered = self.create_transaction("ws_CO_TEST_3")
+        self.make_stale(self.transaction, cancelled, unanswered)
+        self.daraja.set_result("ws_CO_TEST_1", "0", "The service request is processed successfully.")
+        self.daraja.set_result("ws_CO_TEST_2", "1032", "Request cancelled by user")
+
+        stats = reconcile_stale_transactions(older_than=60, page_size=2, workers=4)
+
+        self.assertEqual(stats["checked"], 3)
+        self.assertEqual(stats["success"], 1)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["unresolved"], 1)
+        self.order.refresh_from_db()
+        self.ring.refresh_from_db()
+        cancelled.refresh_from_db()
+        unanswered.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.ring.stock, 4)
+        self.assertEqual(cancelled.status, "failed")
+        self.assertEqual(unanswered.status, "pending")
+        self.transaction.refresh_from_db()
+        self.assertIsNone(self.transaction.mpesa_receipt)
+        self.assertEqual(
+            self.transaction.result_desc,
+            "Reconciled by STK query: The service request is processed successfully. (no M-Pesa receipt returned)",
+        )
+        self.assertEqual(cancelled.result_desc, "Reconciled by STK query: Request cancelled by user")
+
+    def test_receipt_in_the_query_response_is_recorded(self):
+        self.make_stale(self.transaction)
+        response = {
+            "ResultCode": "0",
+            "ResultDesc": "The service request is processed successfully.",
+            "CheckoutRequestID": "ws_CO_TEST_1",
+            "CallbackMetadata": {"Item": [{"Name": "MpesaReceiptNumber", "Value": "RCPQUERY1"}]},
+        }
+
+        with mock.patch("shoptechApp.payments.stk_query", return_value=response):
+            reconcile_stale_transactions(older_than=60)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, "success")
+        self.assertEqual(self.transaction.mpesa_receipt, "RCPQUERY1")
+        self.assertEqual(self.transaction.result_desc, "Reconciled by STK query: The service request is processed successfully.")
+
+    def test_recent_and_settled_transactions_are_left_alone(self):
+        self.daraja.set_result("ws_CO_TEST_1", "0", "Processed")
+        apply_stk_result("ws_CO_TEST_1", 0, "Processed", "RCP123")
+        recent = self.create_transaction("ws_CO_TEST_4")
+        self.daraja.set_result("ws_CO_TEST_4", "0", "Processed")
+        self.make_stale(self.transaction)
+
+        stats = reconcile_stale_transactions(older_than=60)
+
+        self.assertEqual(stats["checked"], 0)
+        recent.refresh_from_db()
+        self.assertEqual(recent.status, "pending")
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.stock, 4)
+
+    def test_abandoned_initiating_transactions_are_failed(self):
+        Transaction.objects.filter(id=self.transaction.id).update(status="initiating", checkout_id=None)
+        self.make_stale(self.transaction)
+
+        call_command("reconcile_mpesa_transactions", "--older-than=60", stdout=StringIO())
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, "failed")
+
+
+@override_settings(RATE_LIMIT_BACKEND="local")
+class RateLimitTests(TestCase):
+    def post_contact(self, **extra):
+        return self.client.post(
+            "/contact/",
+            {"full_name": "Jane", "phone_number": "0700000000", "message": "Hi"},
+            content_type="application/json",
+            **extra,
+        )
+
+    def test_rotating_forwarded_for_does_not_reset_the_window(self):
+        statuses = [
+            self.post_contact(REMOTE_ADDR="10.35.0.1", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}").status_code
+            for i in range(6)
+        ]
+        self.assertEqual(statuses, [201] * 5 + [429])
+
+    def test_forwarded_for_is_trusted_only_num_proxies_deep(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            statuses = [
+                self.post_contact(REMOTE_ADDR="10.35.0.2", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}, 198.51.100.35").status_code
+                for i in range(6)
+            ]
+        self.assertEqual(statuses[-1], 429)
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email="staff@example.com", password="s3cure-Passw0rd", username="staff", is_staff=True
+        )
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.admin).access_token}"}
+
+    def test_demoted_staff_token_is_rejected(self):
+        self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 200)
+
+        self.admin.is_staff = False
+        self.admin.save()
+
+        response = self.client.get("/metrics/auth/", **self.auth)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+
+    def test_role_change_revokes_tokens(self):
+        self.admin.role = "admin"
+        self.admin.save()
+
+        self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 401)
+
+    def test_unrelated_changes_keep_tokens_valid(self):
+        self.admin.first_name = "Renamed"
+        self.admin.save()
+        self.admin.last_login = timezone.now()
+        self.admin.save(update_fields=["last_login"])
+
+        self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 200)
+
+    def test_authenticated_request_loads_no_user(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 200)
+
+    def test_token_issued_right_after_revocation_is_valid(self):
+        self.admin.role = "admin"
+        self.admin.save()
+        fresh = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.admin).access_token}"}  # same second
+
+        self.assertEqual(self.client.get("/metrics/auth/", **fresh).status_code, 200)
+        self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 401)
+
+    @override_settings(JWT_STATELESS_AUTH=False)
+    def test_without_shared_cache_the_user_is_loaded(self):
+        self.admin.is_staff = False
+        self.admin.save()
+        cache.clear()  # another worker never saw the revocation
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/metrics/auth/", **self.auth).status_code, 403)
+
+
+class AsyncViewAuthenticationTests(TestCase):
+    def test_invalid_token_is_rejected_like_drf(self):
+        response = self.client.get("/products/", HTTP_AUTHORIZATION="Bearer garbage")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+        self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+
+    def test_missing_credentials_name_the_scheme(self):
+        response = self.client.get("/orders/1/payment-status/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"detail": "Authentication credentials were not provided."})
+        self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+
+    def test_public_view_without_token(self):
+        self.assertEqual(self.client.get("/products/").status_code, 200)
+
+
+class StkPushRaceTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+        Transaction.objects.filter(id=self.transaction.id).update(status="initiating", checkout_id=None)
+
+    def test_push_answered_after_reconcile_does_not_revive_transaction(self):
+        def slow_push(*args):
+            # reconcile gives up on the transaction while Daraja is answering
+            Transaction.objects.filter(id=self.transaction.id).update(created_at=timezone.now() - timedelta(minutes=10))
+            reconcile_stale_transactions(older_than=60)
+            return {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_LATE"}
+
+        with mock.patch("shoptechApp.payments.stk_push", side_effect=slow_push):
+            send_stk_push(self.transaction.id)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, "failed")
+        self.assertEqual(self.transaction.checkout_id, "ws_CO_LATE")
+
+    def test_abandoned_push_wakes_payment_status_waiters(self):
+        Transaction.objects.filter(id=self.transaction.id).update(created_at=timezone.now() - timedelta(minutes=10))
+
+        with mock.patch("shoptechApp.payments.notify_payment_status") as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                reconcile_stale_transactions(older_than=60)
+
+        notify.assert_called_once_with(self.order.id)
+
+
+class HashingPoolTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="hash@example.com", password="s3cure-Passw0rd", username="hash"
+        )
+
+    def use_pool(self, **limits):
+        pool = HashingPool(**{"workers": 1, "max_queue": 4, "queue_timeout": 5, **limits})
+        patcher = mock.patch("shoptechApp.models.get_hashing_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def login(self, password="s3cure-Passw0rd", **extra):
+        return self.client.post(
+            "/login/", {"email": "hash@example.com", "password": password},
+            content_type="application/json", REMOTE_ADDR="10.34.0.1", **extra,
+        )
+
+    def test_passwords_are_hashed_on_the_pool(self):
+        pool = self.use_pool()
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password="wrong").status_code, 400)
+        self.assertEqual(pool.metrics()["completed"], 2)
+
+    def test_busy_pool_is_a_503_on_login_and_register(self):
+        self.use_pool(max_queue=0)
+
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+        response = self.client.post("/register/", {
+            "username": "new", "first_name": "N", "last_name": "U", "email": "new@example.com",
+            "password": "s3cure-Passw0rd", "password2": "s3cure-Passw0rd",
+        }, content_type="application/json", REMOTE_ADDR="10.34.0.2")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(email="new@example.com").exists())
+
+    def test_busy_pool_outside_views_is_not_an_http_error(self):
+        pool = self.use_pool(max_queue=0)
+
+        with self.assertRaises(HashPoolBusy) as raised:
+            self.user.set_password("another-Passw0rd")
+        self.assertNotIsInstance(raised.exception, APIException)
+        self.assertEqual(pool.metrics()["rejected"], 1)
+
+
+class ProductListTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email="owner@example.com", password="s3cure-Passw0rd", username="owner")
+        self.products = {
+            name: Product.objects.create(
+                name=name, group=group, price=price, discount_price=discount,
+                stock=1, image1="products/rings.png", posted_by=owner,
+            )
+            for name, group, price, discount in [
+                ("Plain ring", "rings", 1000, 0),
+                ("Half-off ring", "rings", 2400, 1200),
+                ("Deal earrings", "earrings", 800, 600),
+            ]
+        }
+
+    def names(self, query):
+        response = self.client.get(f"/products/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()]
+
+    def test_sorts_use_effective_price_and_discount(self):
+        self.assertEqual(self.names("sort=price_asc&fields=name"), ["Deal earrings", "Plain ring", "Half-off ring"])
+        self.assertEqual(self.names("sort=price_desc&fields=name"), ["Half-off ring", "Plain ring", "Deal earrings"])
+        self.assertEqual(self.names("sort=discount&fields=name")[:2], ["Half-off ring", "Deal earrings"])
+
+    def test_filters_and_limit(self):
+        self.assertEqual(self.names("group=rings&min_discount=20&fields=name"), ["Half-off ring"])
+        self.assertEqual(len(self.names("sort=newest&limit=2")), 2)
+
+    def test_non_finite_min_discount_is_rejected(self):
+        for value in ("NaN", "Infinity", "-inf", "abc"):
+            response = self.client.get(f"/products/?min_discount={value}")
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn("min_discount", response.json())
+
+    def test_fields_projection(self):
+        response = self.client.get("/products/?sort=price_asc&fields=name,discount_percentage")
+        self.assertEqual(response.json()[0], {"name": "Deal earrings", "discount_percentage": 25})
+
+
+@override_settings(PAYMENT_STATUS_CHANNEL="local", SERVER_MODE="asgi")
+class PaymentStatusWaitTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+        self.auth = {"headers": {"Authorization": f"Bearer {tokens_for_user(self.buyer).access_token}"}}
+        self.url = f"/orders/{self.order.id}/payment-status/wait/?since=pending"
+
+    async def test_spurious_notification_keeps_waiting_for_a_change(self):
+        async def pay_later():
+            await asyncio.sleep(0.1)
+            notify_payment_status(self.order.id)  # nothing changed yet
+            await asyncio.sleep(0.2)
+            await Transaction.objects.filter(id=self.transaction.id).aupdate(status="success")
+            notify_payment_status(self.order.id)
+
+        task = asyncio.create_task(pay_later())
+        response = await self.async_client.get(f"{self.url}&timeout=5", **self.auth)
+        await task
+
+        data = response.json()
+        self.assertTrue(data["changed"])
+        self.assertEqual(data["transaction_status"], "success")
+
+    async def test_unchanged_status_waits_out_the_timeout(self):
+        async def spurious():
+            await asyncio.sleep(0.05)
+            notify_payment_status(self.order.id)
+
+        task = asyncio.create_task(spurious())
+        started = time.monotonic()
+        response = await self.async_client.get(f"{self.url}&timeout=0.5", **self.auth)
+        await task
+
+        self.assertFalse(response.json()["changed"])
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+    @override_settings(SERVER_MODE="wsgi")
+    async def test_wsgi_answers_immediately(self):
+        started = time.monotonic()
+        response = await self.async_client.get(f"{self.url}&timeout=5", **self.auth)
+
+        self.assertEqual(response.json()["transaction_status"], "pending")
+        self.assertFalse(response.json()["changed"])
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class CompressionMiddlewareTests(TestCase):
+    body = b'{"name": "Infinity Loop Ring"}' * 100
+
+    def compressed(self, request, content_type="application/json"):
+        request.resolver_match = resolve(request.path_info)
+        middleware = CompressionMiddleware(lambda request: HttpResponse(self.body, content_type=content_type))
+        return middleware(request).get("Content-Encoding")
+
+    def get(self, path="/products/"):
+        return RequestFactory().get(path, HTTP_ACCEPT_ENCODING="gzip")
+
+    def test_json_is_compressed(self):
+        self.assertEqual(self.compressed(self.get()), "gzip")
+
+    def test_html_is_not_compressed(self):
+        self.assertIsNone(self.compressed(self.get(), content_type="text/html; charset=utf-8"))
+
+    def test_responses_using_the_csrf_token_are_not_compressed(self):
+        request = self.get()
+        get_token(request)
+        self.assertIsNone(self.compressed(request))
+
+    def test_admin_is_not_compressed(self):
+        self.assertIsNone(self.compressed(self.get("/admin/jsi18n/")))
+
+
+@override_settings(MPESA_ASYNC_STK_PUSH=True, BACKGROUND_TASKS_EAGER=True)
+class AsyncStkPushTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+        self.transaction.delete()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.buyer).access_token}"}
+
+    def pay(self):
+        return self.client.post(
+            "/mpesa/pay/", {"phone_number": "254700000000", "order_id": self.order.id},
+            content_type="application/json", **self.auth,
+        )
+
+    def test_returns_202_and_queues_the_push_on_commit(self):
+        with mock.patch("shoptechApp.tasks.submit") as submit:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.pay()
+            submit.assert_not_called()  # nothing leaves before the row is committed
+
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(response.status_code, 202)
+        transaction = Transaction.objects.get(order=self.order)
+        self.assertEqual(transaction.status, "initiating")
+        self.assertEqual(response.json()["transaction_id"], transaction.id)
+        self.assertEqual(response.json()["status_url"], f"/orders/{self.order.id}/payment-status/")
+        submit.assert_called_once_with(send_stk_push, transaction.id)
+
+    def test_background_push_records_the_checkout_id(self):
+        accepted = {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_ASYNC"}
+        with mock.patch("shoptechApp.payments.stk_push", return_value=accepted):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pay()
+
+        transaction = Transaction.objects.get(order=self.order)
+        self.assertEqual((transaction.status, transaction.checkout_id), ("pending", "ws_CO_ASYNC"))
+
+    def test_second_attempt_while_initiating_is_rejected(self):
+        with mock.patch("shoptechApp.tasks.submit"), self.captureOnCommitCallbacks():
+            self.pay()
+            response = self.pay()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.filter(order=self.order).count(), 1)
+
+
+class DarajaSimulatorTests(SimpleTestCase):
+    def start(self, **options):
+        simulator = DarajaSimulator(seed=1, **options).start()
+        self.addCleanup(simulator.stop)
+        override = override_settings(MPESA_BASE_URL=simulator.base_url)
+        override.enable()
+        self.addCleanup(override.disable)
+        return simulator
+
+    def test_push_is_answered_by_callback_and_query(self):
+        simulator = self.start(callback_delay=0)
+        delivered = threading.Event()
+        callbacks = []
+
+        def receive(url, json, timeout):
+            callbacks.append((url, json))
+            delivered.set()
+            return mock.Mock(raise_for_status=lambda: None)
+
+        # only the simulator's outgoing callback; the app still talks HTTP to it
+        with mock.patch("shoptechApp.daraja_simulator.requests", post=receive, exceptions=requests.exceptions):
+            response = stk_push("254700000000", 1500, 42)
+            self.assertTrue(delivered.wait(5))
+
+        self.assertEqual(response["ResponseCode"], "0")
+        url, payload = callbacks[0]
+        self.assertEqual(url, settings.MPESA_CALLBACK_URL)
+        result = parse_stk_callback(payload)
+        self.assertEqual(result["checkout_id"], response["CheckoutRequestID"])
+        self.assertEqual(result["result_code"], 0)
+        self.assertTrue(result["mpesa_receipt"])
+        self.assertEqual(stk_query(response["CheckoutRequestID"])["ResultCode"], "0")
+        self.assertEqual(simulator.stats["callbacks_sent"], 1)
+
+    def test_declines_and_outages(self):
+        simulator = self.start(decline_rate=1.0)
+        checkout_id = stk_push("254700000000", 10, 1)["CheckoutRequestID"]
+        with self.assertRaises(MpesaError):  # still processing: no result yet
+            stk_query(checkout_id)
+
+        simulator.failure_rate = 1.0
+        with self.assertRaises(MpesaError):
+            stk_push("254700000000", 10, 1)
+        self.assertGreater(simulator.stats["errors"], 0)
+
+
+class DatabaseConnectionSettingsTests(SimpleTestCase):
+    def database_settings(self, **env):
+        """DATABASES["default"] as settings.py builds it from these environment variables."""
+        script = (
+            "import json; from shoptech import settings; "
+            "print(json.dumps(settings.DATABASES['default'], default=str))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            env={**os.environ, "DB_POOL": "False", "SERVER_MODE": "wsgi", "DB_CONN_MAX_AGE": "60", **env},
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_persistent_connections_by_default(self):
+        database = self.database_settings()
+        self.assertEqual(database["CONN_MAX_AGE"], 60)
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", database["OPTIONS"])
+
+    def test_pool_replaces_persistent_connections(self):
+        database = self.database_settings(DB_POOL="True", DB_POOL_MAX_SIZE="7")
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+        self.assertEqual(database["OPTIONS"]["pool"]["max_size"], 7)
+
+    def test_asgi_never_keeps_connections(self):
+        self.assertEqual(self.database_settings(SERVER_MODE="asgi")["CONN_MAX_AGE"], 0)
+
+
+class SharedCacheSettingsTests(SimpleTestCase):
+    def load_settings(self, *names, **env):
+        """Import settings.py with these environment variables; (returncode, values or stderr)."""
+        script = (
+            "import json; from shoptech import settings; "
+            f"print(json.dumps([getattr(settings, name) for name in {list(names)!r}]))"
+        )
+        base = {key: value for key, value in os.environ.items() if key not in ("REDIS_URL", "PAYMENT_STATUS_CHANNEL", "JWT_STATELESS_AUTH")}
+        result = subprocess.run(
+            [sys.executable, "-c", script], env={**base, **env},
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            return result.returncode, result.stderr
+        return 0, json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_payment_status_channel_follows_redis_url(self):
+        self.assertEqual(self.load_settings("PAYMENT_STATUS_CHANNEL"), (0, ["local"]))
+        self.assertEqual(
+            self.load_settings("PAYMENT_STATUS_CHANNEL", REDIS_URL="redis://redis:6379/0"), (0, ["cache"])
+        )
+
+    def test_claim_only_auth_follows_redis_url(self):
+        self.assertEqual(self.load_settings("JWT_STATELESS_AUTH"), (0, [False]))
+        self.assertEqual(self.load_settings("JWT_STATELESS_AUTH", REDIS_URL="redis://redis:6379/0"), (0, [True]))
+
+        returncode, stderr = self.load_settings("JWT_STATELESS_AUTH", JWT_STATELESS_AUTH="True")
+        self.assertNotEqual(returncode, 0)
+        self.assertIn("ImproperlyConfigured", stderr)
+
+    def test_cache_channel_requires_redis(self):
+        returncode, stderr = self.load_settings("PAYMENT_STATUS_CHANNEL", PAYMENT_STATUS_CHANNEL="cache")
+        self.assertNotEqual(returncode, 0)
+        self.assertIn("ImproperlyConfigured", stderr)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    data = {
+        "name": "Bague à l'infini ✨",
+        "separators": "line paragraph end",
+        "price": Decimal("1499.99"),
+        "discount": 12.5,
+        "stock": 3,
+        "best_seller": True,
+        "description": None,
+        "posted": datetime(2025, 9, 27, 17, 21, 0, 123456, tzinfo=dt_timezone.utc),
+        "posted_local": datetime(2025, 9, 27, 20, 21, tzinfo=dt_timezone(timedelta(hours=3))),
+        "day": date(2025, 9, 27),
+        "at": dt_time(17, 21),
+        "window": timedelta(days=7, seconds=5),
+        "code": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "label": gettext_lazy("Invalid email or password"),
+        "nested": [{"id": 1, "tags": ("a", "b")}, [], {}],
+        2: "non-string key",
+    }
+
+    def test_matches_drf_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indented_output_matches_drf(self):
+        context = {"indent": 2}
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, renderer_context=context),
+            JSONRenderer().render(self.data, renderer_context=context),
+        )
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_parser_matches_drf_json_parser(self):
+        body = '{"name": "Bague ✨", "price": "1499.99", "items": [1, 2.5, null, true]}'.encode()
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_parser_honours_the_request_encoding(self):
+        body = '{"name": "Bague à"}'.encode("latin-1")
+        self.assertEqual(ORJSONParser().parse(BytesIO(body), parser_context={"encoding": "latin-1"}), {"name": "Bague à"})
+
+    def test_invalid_json_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"name": '))
+
+
+class ProductValuesSerializerTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email="owner@example.com", password="s3cure-Passw0rd", username="owner")
+        Product.objects.create(
+            name="Infinity Loop Ring", price=Decimal("1499.99"), discount_price=Decimal("999.50"), stock=5,
+            collection="Eternal", color="Gold", size="7", best_seller=True, description="Classic",
+            image1="products/rings.png", image2="products/ring side view é.png", posted_by=owner,
+        )
+        Product.objects.create(name="Plain Bangle", group="bangles", price=500, stock=0, image1="products/b.png", posted_by=owner)
+        self.request = Request(RequestFactory().get("/products/"))
+
+    def assertMatchesProductSerializer(self, request, fields=None):
+        serializer = ProductValuesSerializer(request, fields)
+        rows = Product.objects.order_by("id").values(*serializer.columns)
+        fast = [serializer.to_representation(row) for row in rows]
+        expected = ProductSerializer(Product.objects.order_by("id"), many=True, context={"request": request}).data
+        if fields is not None:
+            expected = [{name: value for name, value in item.items() if name in fields} for item in expected]
+        self.assertEqual(ORJSONRenderer().render(fast), ORJSONRenderer().render(expected))
+
+    def test_matches_product_serializer(self):
+        self.assertMatchesProductSerializer(self.request)
+
+    def test_matches_product_serializer_for_a_field_subset(self):
+        self.assertMatchesProductSerializer(self.request, {"name", "discount_percentage", "image2", "date_posted"})
+
+    def test_matches_product_serializer_without_a_request(self):
+        self.assertMatchesProductSerializer(None)
+
+    def test_empty_selection_still_selects_a_column(self):
+        self.assertEqual(ProductValuesSerializer(self.request, set()).columns, ["pk"])
+
+
+@override_settings(JWT_STATELESS_AUTH=True)  # no User query per request
+class SparseFieldsTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.buyer).access_token}"}
+
+    def get(self, url):
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_field_selection_trees(self):
+        selection = FieldSelection("id,items.quantity,items.product.name", "items.product.price")
+        self.assertEqual(selection.filter(["id", "status", "items"]), ["id", "items"])
+        self.assertEqual(selection.child("items").filter(["id", "quantity", "product"]), ["quantity", "product"])
+        self.assertEqual(selection.child("items").child("product").filter(["name", "price"]), ["name"])
+        self.assertEqual(FieldSelection(None, "items").filter(["id", "items"]), ["id"])
+        self.assertFalse(FieldSelection())
+
+    def test_order_list_returns_and_loads_only_the_selected_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            orders = self.get("/orders/?fields=id,items.quantity,items.product.name")
+
+        self.assertEqual(orders, [{"id": self.order.id, "items": [
+            {"quantity": 1, "product": {"name": "Infinity Loop Ring"}},
+            {"quantity": 1, "product": {"name": "Gold Bangle"}},
+        ]}])
+        self.assertEqual(len(queries), 2)  # orders, then items joined to products
+        self.assertNotIn("description", " ".join(query["sql"] for query in queries))
+
+    def test_excluded_nested_list_is_not_fetched(self):
+        with CaptureQueriesContext(connection) as queries:
+            order = self.get(f"/orders/{self.order.id}/?exclude=items,buyer")
+
+        self.assertEqual(set(order), {"id", "status", "total_price", "created_at"})
+        self.assertEqual(len(queries), 1)
+
+    def test_full_order_matches_order_serializer(self):
+        order = self.get(f"/orders/{self.order.id}/")
+        expected = OrderSerializer(Order.objects.get(id=self.order.id), context={"request": RequestFactory().get("/")}).data
+        self.assertEqual(order, json.loads(ORJSONRenderer().render(expected)))
+
+    def test_cart_fields(self):
+        cart = Cart.objects.create(buyer=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.ring, quantity=2)
+
+        self.assertEqual(self.get("/cart/?fields=items.quantity,items.total_price"), {
+            "items": [{"quantity": 2, "total_price": 2000.0}],
+        })
+
+
+class ProductBatchTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_paid_order_fixture()
+
+    def batch(self, *codes):
+        return self.client.get("/products/batch/", {"codes": ",".join(codes), "fields": "product_code,name,stock"})
+
+    def test_rows_in_request_order_then_from_cache(self):
+        codes = (self.bangle.product_code, "PRD-MISSING", self.ring.product_code)
+        expected = {
+            "results": [
+                {"product_code": self.bangle.product_code, "name": "Gold Bangle", "stock": 1},
+                None,
+                {"product_code": self.ring.product_code, "name": "Infinity Loop Ring", "stock": 5},
+            ],
+            "missing": ["PRD-MISSING"],
+        }
+
+        with self.assertNumQueries(1):  # both misses in one product_code__in query
+            self.assertEqual(self.batch(*codes).json(), expected)
+        with self.assertNumQueries(1):  # only the code that doesn't exist is looked up again
+            self.assertEqual(self.batch(*codes).json(), expected)
+        with self.assertNumQueries(0):
+            self.batch(self.ring.product_code, self.bangle.product_code)
+
+    def test_product_save_drops_cached_row_on_commit(self):
+        self.batch(self.ring.product_code)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.ring.name = "Moebius Ring"
+            self.ring.save()
+        self.assertIsNotNone(cache.get(f"product:{self.ring.product_code}"))  # not before commit
+        for callback in callbacks:
+            callback()
+
+        self.assertIsNone(cache.get(f"product:{self.ring.product_code}"))
+        self.assertEqual(self.batch(self.ring.product_code).json()["results"][0]["name"], "Moebius Ring")
+
+    @override_settings(PRODUCT_BATCH_MAX_CODES=2)
+    def test_code_count_is_validated(self):
+        response = self.batch("PRD-A", "PRD-B", "PRD-C")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"codes": "At most 2 product codes per request."})
+
+        self.assertEqual(self.client.get("/products/batch/?codes=,").status_code, 400)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ProductStockTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_paid_order_fixture()
+
+    def stock(self, *codes):
+        response = self.client.get("/products/stock/", {"codes": ",".join(codes)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_levels_keyed_by_code(self):
+        codes = (self.ring.product_code, "PRD-MISSING", self.bangle.product_code)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.stock(*codes), {
+                self.ring.product_code: 5, "PRD-MISSING": None, self.bangle.product_code: 1,
+            })
+        with self.assertNumQueries(0):
+            self.stock(self.ring.product_code, self.bangle.product_code)
+
+    def test_stock_save_invalidates_cached_level(self):
+        self.stock(self.ring.product_code)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ring.stock = 2
+            self.ring.save(update_fields=["stock"])
+
+        self.assertIsNone(cache.get(f"stock:{self.ring.product_code}"))
+        self.assertEqual(self.stock(self.ring.product_code), {self.ring.product_code: 2})
+
+    def test_paid_order_invalidates_cached_levels(self):
+        codes = (self.ring.product_code, self.bangle.product_code)
+        self.stock(*codes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stk_result("ws_CO_TEST_1", 0, "Processed", "RCP123")
+
+        self.assertEqual(self.stock(*codes), {self.ring.product_code: 4, self.bangle.product_code: 0})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class SalesRollupTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_paid_order_fixture()
+
+    def pay(self, checkout_id="ws_CO_TEST_1"):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stk_result(checkout_id, 0, "Processed", "RCP123")
+
+    def sales(self):
+        return {
+            row.product_id: (row.units_7d, row.revenue_7d, row.units_30d, row.revenue_30d)
+            for row in ProductSales.objects.all()
+        }
+
+    def paid_order(self, days_ago, ring_quantity):
+        """A paid order for ring_quantity rings, charged days_ago."""
+        order = Order.objects.create(buyer=self.buyer, total_price=1000 * ring_quantity, status="paid")
+        OrderItem.objects.create(order=order, product=self.ring, quantity=ring_quantity, price=1000)
+        transaction = Transaction.objects.create(
+            buyer=self.buyer, order=order, phone_number="254700000000", amount=1000 * ring_quantity,
+            checkout_id=f"ws_CO_{uuid.uuid4().hex}", status="success",
+        )
+        paid_at = timezone.now() - timedelta(days=days_ago)
+        Order.objects.filter(id=order.id).update(created_at=paid_at)
+        Transaction.objects.filter(id=transaction.id).update(created_at=paid_at)
+        return order
+
+    def test_payment_increments_once(self):
+        self.pay()
+        self.pay()  # duplicate callback
+
+        self.assertEqual(self.sales(), {
+            self.ring.id: (1, Decimal("1000.00"), 1, Decimal("1000.00")),
+            self.bangle.id: (1, Decimal("500.00"), 1, Decimal("500.00")),
+        })
+
+        # Each newly paid order adds to the existing rows
+        record_order_sales(self.paid_order(days_ago=0, ring_quantity=2).id)
+        self.assertEqual(self.sales()[self.ring.id], (3, Decimal("3000.00"), 3, Decimal("3000.00")))
+
+    def test_recompute_ages_sales_out_and_marks_best_sellers(self):
+        self.pay()
+        self.paid_order(days_ago=10, ring_quantity=2)  # 30d window only
+        self.paid_order(days_ago=40, ring_quantity=5)  # no window
+        Product.objects.filter(id=self.bangle.id).update(best_seller=True)
+        Transaction.objects.filter(order=self.order).update(created_at=timezone.now() - timedelta(days=45))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = recompute_sales_rollup(best_seller_count=1)
+
+        self.assertEqual(stats, {"products": 1, "zeroed": 1, "best_sellers": 1})
+        self.assertEqual(self.sales(), {
+            self.ring.id: (0, Decimal("0.00"), 2, Decimal("2000.00")),
+            self.bangle.id: (0, Decimal("0.00"), 0, Decimal("0.00")),
+        })
+        self.assertEqual(
+            dict(Product.objects.values_list("name", "best_seller")),
+            {"Infinity Loop Ring": True, "Gold Bangle": False},
+        )
+
+    def test_best_sellers_endpoint(self):
+        self.pay()
+        ProductSales.objects.filter(product=self.ring).update(units_7d=0, revenue_7d=0, units_30d=3)
+
+        def names(query):
+            response = self.client.get(f"/products/best-sellers/?fields=name&{query}")
+            self.assertEqual(response.status_code, 200)
+            return [product["name"] for product in response.json()]
+
+        self.assertEqual(names("window=7d"), ["Gold Bangle"])
+        self.assertEqual(names(""), ["Infinity Loop Ring", "Gold Bangle"])
+        self.assertEqual(names("window=30d&limit=1"), ["Infinity Loop Ring"])
+
+        response = self.client.get("/products/best-sellers/?window=1y")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"window": "Choose one of: 7d, 30d."})
+        self.assertEqual(self.client.get("/products/best-sellers/?limit=0").status_code, 400)
+
+
+class RelatedProductsTests(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(
+            email="buyer@example.com", password="s3cure-Passw0rd", username="buyer"
+        )
+        posted = timezone.now() - timedelta(days=30)
+
+        def product(name, group, collection=None, color=None):
+            nonlocal posted
+            posted += timedelta(days=1)  # each one newer than the last
+            return Product.objects.create(
+                name=name, group=group, collection=collection, color=color, price=1000,
+                image1="products/rings.png", posted_by=self.buyer, date_posted=posted,
+            )
+
+        self.anchor = product("Eternity Ring", "rings", "Eternity", "gold")
+        product("Eternity Necklace", "necklaces", "Eternity", "silver")  # collection: 3
+        product("Gold Band", "rings", color="gold")  # group + color: 3, newer
+        product("Silver Band", "rings", color="silver")  # group: 2
+        bangle = product("Plain Bangle", "bangles")  # two co-purchases: 4
+        earrings = product("Stud Earrings", "earrings")  # only in an unpaid order
+
+        for status, other in (("paid", bangle), ("delivered", bangle), ("pending", earrings)):
+            order = Order.objects.create(buyer=self.buyer, total_price=2000, status=status)
+            OrderItem.objects.create(order=order, product=self.anchor, quantity=1, price=1000)
+            OrderItem.objects.create(order=order, product=other, quantity=1, price=1000)
+
+    def related(self, product_code):
+        response = self.client.get(f"/products/{product_code}/related/?fields=name")
+        self.assertEqual(response.status_code, 200)
+        return [product["name"] for product in response.json()]
+
+    def test_ranks_co_purchases_then_shared_attributes(self):
+        self.assertEqual(refresh_related_products(count=4), RelatedProduct.objects.count())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.related(self.anchor.product_code),
+                ["Plain Bangle", "Gold Band", "Eternity Necklace", "Silver Band"],
+            )
+
+    def test_refresh_replaces_previous_rows(self):
+        refresh_related_products(count=3)
+        refresh_related_products(count=1)
+
+        self.assertEqual(RelatedProduct.objects.filter(product=self.anchor).count(), 1)
+        self.assertEqual(self.related(self.anchor.product_code), ["Plain Bangle"])
+
+    def test_unknown_product_is_not_found(self):
+        self.assertEqual(self.related(self.anchor.product_code), [])  # not refreshed yet
+        self.assertEqual(self.client.get("/products/PRD-MISSING/related/").status_code, 404)
+
+
+class DailySalesRollupTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        self.create_paid_order_fixture()
+        self.admin = User.objects.create_user(
+            email="staff@example.com", password="s3cure-Passw0rd", username="staff", is_staff=True
+        )
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.admin).access_token}"}
+        self.day1 = timezone.localdate() - timedelta(days=3)
+        self.day2 = self.day1 + timedelta(days=1)
+        Product.objects.filter(id=self.bangle.id).update(group="bangles")
+
+        # Order 1 (ring + bangle) paid on day 1
+        Order.objects.filter(id=self.order.id).update(status="paid", created_at=self.at(self.day1))
+        Transaction.objects.filter(id=self.transaction.id).update(status="success", created_at=self.at(self.day1))
+
+        # Order 2 (two rings) placed and declined on day 1, paid on day 2
+        order = Order.objects.create(buyer=self.buyer, total_price=2000, status="paid")
+        OrderItem.objects.create(order=order, product=self.ring, quantity=2, price=1000)
+        Order.objects.filter(id=order.id).update(created_at=self.at(self.day1))
+        for status, day in (("failed", self.day1), ("success", self.day2), ("pending", self.day2)):
+            transaction = Transaction.objects.create(
+                buyer=self.buyer, order=order, phone_number="254700000000", amount=2000,
+                checkout_id=f"ws_CO_{uuid.uuid4().hex}", status=status,
+            )
+            Transaction.objects.filter(id=transaction.id).update(created_at=self.at(day))
+
+    def at(self, day):
+        return timezone.make_aware(datetime.combine(day, dt_time(12)))
+
+    def get(self, path, **params):
+        return self.client.get(path, {"start": self.day1, "end": self.day2, **params}, **self.auth)
+
+    def test_rollup_totals_per_day_and_is_idempotent(self):
+        for _ in range(2):
+            stats = rollup_daily_sales(since=self.day1 - timedelta(days=1), until=self.day2)
+            self.assertEqual(stats, {"days": 3, "orders": 2, "product_rows": 3, "group_rows": 3})
+
+        self.assertEqual(
+            [(row.day, row.orders, row.units, row.revenue, row.payment_success_rate)
+             for row in DailySales.objects.order_by("day")],
+            [
+                (self.day1 - timedelta(days=1), 0, 0, Decimal("0.00"), None),
+                (self.day1, 1, 2, Decimal("1500.00"), 0.5),
+                (self.day2, 1, 2, Decimal("2000.00"), 1.0),
+            ],
+        )
+        self.assertEqual(DailySales.objects.get(day=self.day2).payments_pending, 1)
+        self.assertEqual(DailyProductSales.objects.count(), 3)
+        self.assertEqual(
+            sorted(DailyGroupSales.objects.values_list("day", "group", "units")),
+            [(self.day1, "bangles", 1), (self.day1, "rings", 1), (self.day2, "rings", 2)],
+        )
+
+    def test_reports(self):
+        rollup_daily_sales(since=self.day1, until=self.day2)
+
+        sales = self.get("/analytics/sales/").json()
+        self.assertEqual(sales["totals"], {
+            "orders": 2, "units": 4, "revenue": "3500.00",
+            "payments_success": 2, "payments_failed": 1, "payments_pending": 1, "payment_success_rate": 0.6667,
+        })
+        self.assertEqual([day["day"] for day in sales["days"]], [str(self.day1), str(self.day2)])
+
+        products = self.get("/analytics/products/").json()["products"]
+        self.assertEqual([(p["name"], p["orders"], p["units"], p["revenue"]) for p in products], [
+            ("Infinity Loop Ring", 2, 3, "3000.00"),
+            ("Gold Bangle", 1, 1, "500.00"),
+        ])
+        self.assertEqual(len(self.get("/analytics/products/", limit=1).json()["products"]), 1)
+
+        groups = self.get("/analytics/groups/").json()["groups"]
+        self.assertEqual([(g["group"], g["revenue"]) for g in groups], [("rings", "3000.00"), ("bangles", "500.00")])
+
+    def test_admin_only(self):
+        buyer = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.buyer).access_token}"}
+        for path in ("/analytics/sales/", "/analytics/products/", "/analytics/groups/"):
+            self.assertEqual(self.client.get(path).status_code, 401)
+            self.assertEqual(self.client.get(path, **buyer).status_code, 403)
+            self.assertEqual(self.client.get(path, **self.auth).status_code, 200)
+
+    @override_settings(ANALYTICS_MAX_DAYS=7)
+    def test_date_validation(self):
+        def error(**params):
+            response = self.client.get("/analytics/sales/", params, **self.auth)
+            self.assertEqual(response.status_code, 400)
+            return response.json()
+
+        self.assertEqual(error(start="2026-13-01"), {"start": "Use the YYYY-MM-DD format."})
+        self.assertEqual(error(start="2026-03-02", end="2026-03-01"), {"start": "Must not be after end."})
+        self.assertEqual(error(start="2026-03-01", end="2026-03-08"), {"start": "Ranges are limited to 7 days."})
+        self.assertEqual(self.client.get(
+            "/analytics/sales/", {"start": "2026-03-01", "end": "2026-03-07"}, **self.auth
+        ).status_code, 200)
+
+
+@override_settings(JWT_STATELESS_AUTH=True, BACKGROUND_TASKS_EAGER=True)  # no User query per request
+class OrderReceiptTests(PaymentFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_paid_order_fixture()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.buyer).access_token}"}
+        self.url = f"/orders/{self.order.id}/success/"
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stk_result("ws_CO_TEST_1", 0, "Processed", "RCP123")
+
+    def receipt(self):
+        return self.client.get(self.url, **self.auth)
+
+    def test_payment_status_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/orders/{self.order.id}/payment-status/", **self.auth)
+        self.assertEqual(response.json()["transaction_status"], "success")
+        self.assertEqual(response.json()["mpesa_receipt"], "RCP123")
+
+    def test_receipt_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            receipt = self.receipt().json()
+        self.assertEqual(receipt["payment"]["mpesa_receipt"], "RCP123")
+        self.assertEqual(
+            [(item["product_name"], item["quantity"]) for item in receipt["order"]["items"]],
+            [("Infinity Loop Ring", 1), ("Gold Bangle", 1)],
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.receipt().json(), receipt)
+
+    def test_order_changes_drop_the_cached_receipt(self):
+        self.receipt()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ring.name = "Moebius Ring"
+            self.ring.save()
+        self.assertEqual(self.receipt().json()["order"]["items"][0]["product_name"], "Moebius Ring")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.refresh_from_db()
+            self.order.status = "shipped"
+            self.order.save()
+        # Same answer as the uncached view
+        self.assertEqual(self.receipt().status_code, 400)
+
+    def test_transaction_change_drops_the_cached_receipt(self):
+        self.receipt()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transaction.refresh_from_db()
+            self.transaction.mpesa_receipt = "RCP456"
+            self.transaction.save()
+        self.assertEqual(self.receipt().json()["payment"]["mpesa_receipt"], "RCP456")
+
+    def test_unknown_and_unpaid_orders(self):
+        other = Order.objects.create(buyer=self.buyer, total_price=0)
+        self.assertEqual(self.client.get(f"/orders/{other.id}/success/", **self.auth).status_code, 400)
+        self.assertEqual(self.client.get(f"/orders/{other.id + 1}/success/", **self.auth).status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], JWT_STATELESS_AUTH=True)
+class ReplicaRoutingTests(PaymentFixturesMixin, TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.create_paid_order_fixture()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.buyer).access_token}"}
+
+    def queries_by_alias(self, call):
+        """Run call(); return (its result, {alias: number of queries})."""
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                result = call()
+        return result, {"default": len(primary), "replica": len(replica)}
+
+    def test_catalog_and_history_reads_use_the_replica(self):
+        for path in ("/products/", "/products/filters/", "/orders/"):
+            response, queries = self.queries_by_alias(lambda: self.client.get(path, **self.auth))
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(queries["default"], 0, path)
+            self.assertGreater(queries["replica"], 0, path)
+
+    def test_user_reads_own_writes_from_the_primary(self):
+        response = self.client.post("/cart/", {"product_code": self.ring.product_code}, **self.auth)
+        self.assertEqual(response.status_code, 201)
+
+        response, queries = self.queries_by_alias(lambda: self.client.get("/orders/", **self.auth))
+        self.assertEqual([order["id"] for order in response.json()], [self.order.id])
+        self.assertEqual(queries["replica"], 0)
+
+        # Other users are not pinned
+        other = User.objects.create_user(email="other@example.com", password="s3cure-Passw0rd", username="other")
+        other_auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(other).access_token}"}
+        _, queries = self.queries_by_alias(lambda: self.client.get("/orders/", **other_auth))
+        self.assertEqual(queries["default"], 0)
+
+    def test_writes_and_locks_always_use_the_primary(self):
+        def write_inside_replica_block():
+            with replica_reads():
+                Transaction.objects.select_for_update().filter(id=self.transaction.id).first()
+                Product.objects.filter(id=self.ring.id).update(stock=3)
+                Cart.objects.get_or_create(buyer=self.buyer)
+                return Product.objects.count()
+
+        _, queries = self.queries_by_alias(write_inside_replica_block)
+        self.assertEqual(queries["replica"], 1)  # only the plain count
+        self.assertGreaterEqual(queries["default"], 4)
+
+    def test_failed_writes_do_not_pin(self):
+        response = self.client.post("/cart/", {"product_code": "PRD-MISSING"}, **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+        _, queries = self.queries_by_alias(lambda: self.client.get("/orders/", **self.auth))
+        self.assertEqual(queries["default"], 0)
+
+
+class StaticFilesTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=static_root))
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def get(self, path, **extra):
+        response = self.client.get(path, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hashed_url_is_served_with_far_future_cache_headers(self):
+        url = static("admin/css/base.css")
+        self.assertRegex(url, r"^/static/admin/css/base\.[0-9a-f]{12}\.css$")
+
+        response = self.get(url)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=315360000", response["Cache-Control"])
+
+        # The unhashed name is still served, but may change
+        self.assertNotIn("immutable", self.get("/static/admin/css/base.css")["Cache-Control"])
+
+    def test_precompressed_variants_follow_accept_encoding(self):
+        url = static("admin/css/base.css")
+        plain = b"".join(self.get(url).streaming_content)
+
+        for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            response = self.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response["Content-Encoding"], encoding)
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+            self.assertEqual(decompress(b"".join(response.streaming_content)), plain)
+
+    def test_files_missing_from_the_manifest_keep_their_plain_url(self):
+        self.assertEqual(static("not-collected.css"), "/static/not-collected.css")
+
+
+class StaticFilesWithoutManifestTests(TestCase):
+    def setUp(self):
+        static_root = tempfile.mkdtemp()  # collectstatic never ran
+        self.addCleanup(shutil.rmtree, static_root)
+        override = override_settings(STATIC_ROOT=static_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_templates_still_render(self):
+        rendered = Template("{% load static %}{% static 'admin/css/base.css' %}").render(Context())
+        self.assertEqual(rendered, "/static/admin/css/base.css")
+
+        response = self.client.get("/admin/login/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "/static/admin/css/base.css")
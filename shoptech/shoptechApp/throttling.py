@@ -0,0 +1,119 @@
+"""
+Sliding-window rate limiting for public endpoints.
+
+Each view names a scope (``throttle_scope``) whose rate lives in
+``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]``, and optionally what to count
+by (``throttle_key``: ``"ip"``, ``"user"`` or ``"route"``). Counting uses
+the sliding-window counter approximation: the previous fixed window's count,
+weighted by how much of it still overlaps the sliding window, plus the
+current window's count. That needs two counters per key and one atomic
+increment per request.
+
+Counters live in a pluggable backend (``RATE_LIMIT_BACKEND``): ``"local"``
+keeps them in process memory behind a lock, ``"cache"`` uses the shared
+Django cache (atomic ``incr``) so limits hold across worker processes.
+Rejected requests get a 429 with ``Retry-After``.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60)``, using the first letter of the period like DRF."""
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]]
+
+
+class LocalCounterBackend:
+    """In-process counters; only limits a single worker process."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def incr_and_get(self, key, previous_key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+                self._next_purge = now + 60
+            count, expires = self._counts.get(key, (0, now + ttl))
+            self._counts[key] = (count + 1, expires)
+            previous = self._counts.get(previous_key, (0, 0))[0]
+        return count + 1, previous
+
+
+class CacheCounterBackend:
+    """Counters in the Django cache, shared by every process using it."""
+
+    def incr_and_get(self, key, previous_key, ttl):
+        cache.add(key, 0, timeout=ttl)
+        try:
+            current = cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            cache.set(key, 1, timeout=ttl)
+            current = 1
+        return current, cache.get(previous_key, 0)
+
+
+_backends = {"local": LocalCounterBackend(), "cache": CacheCounterBackend()}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+    key = "ip"
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", self.scope)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        self.limit, self.window = parse_rate(rate)
+        now = time.time()
+        window_index = int(now // self.window)
+        self.elapsed = now - window_index * self.window
+
+        ident = self.get_key(request, view, scope)
+        counter_key = f"rl:{scope}:{ident}:{window_index}"
+        previous_key = f"rl:{scope}:{ident}:{window_index - 1}"
+
+        backend = _backends[settings.RATE_LIMIT_BACKEND]
+        self.current, self.previous = backend.incr_and_get(counter_key, previous_key, ttl=self.window * 2)
+
+        weight = 1 - self.elapsed / self.window
+        return self.previous * weight + self.current <= self.limit
+
+    def get_key(self, request, view, scope):
+        key = getattr(view, "throttle_key", self.key)
+        if key == "route":
+            return "all"
+        if key == "user" and request.user and request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return self.get_ident(request)
+
+    def wait(self):
+        """Seconds until the weighted count drops back under the limit."""
+        remaining_in_window = self.window - self.elapsed
+        if self.current >= self.limit or not self.previous:
+            return math.ceil(remaining_in_window)
+        # previous * (1 - t / window) + current <= limit, solved for t
+        t = self.window * (1 - (self.limit - self.current) / self.previous)
+        return max(1, math.ceil(t - self.elapsed))
+
+
+class MpesaCallbackThrottle(SlidingWindowThrottle):
+    scope = "mpesa_callback"
+
+
+class MpesaSimulateThrottle(SlidingWindowThrottle):
+    scope = "mpesa_simulate"
@@ -1,5 +1,5 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import *
 from . import views
 from django.conf import settings
@@ -34,8 +34,12 @@ urlpatterns = [
     path("login/", LoginView.as_view(), name="login"),
 
     # JWT Authentication
-    path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),   # login
+    path("token/", ThrottledTokenObtainPairView.as_view(), name="token_obtain_pair"),   # login
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"), # refresh token
+    path("metrics/auth/", AuthMetricsView.as_view(), name="auth-metrics"),
+    path("analytics/sales/", SalesAnalyticsView.as_view(), name="analytics-sales"),
+    path("analytics/products/", ProductAnalyticsView.as_view(), name="analytics-products"),
+    path("analytics/groups/", GroupAnalyticsView.as_view(), name="analytics-groups"),
     
     
   # Admin
@@ -44,8 +48,12 @@ urlpatterns = [
 
     # Public
     path("products/", ProductListView.as_view(), name="product-list"),
-    path("products/<str:product_code>/", ProductDetailView.as_view(), name="product-detail"),
     path("products/filters/", ProductFiltersView.as_view(), name="product-filters"),
+    path("products/batch/", ProductBatchView.as_view(), name="product-batch"),
+    path("products/stock/", ProductStockView.as_view(), name="product-stock"),
+    path("products/best-sellers/", BestSellersView.as_view(), name="product-best-sellers"),
+    path("products/<str:product_code>/", ProductDetailView.as_view(), name="product-detail"),
+    path("products/<str:product_code>/related/", RelatedProductsView.as_view(), name="product-related"),
     
     
     # Cart (Buyer only)
@@ -67,6 +75,7 @@ urlpatterns = [
     
     # Order payment status endpoints
     path('orders/<int:order_id>/payment-status/', views.check_payment_status, name='check_payment_status'),
+    path('orders/<int:order_id>/payment-status/wait/', views.wait_for_payment_status, name='wait_for_payment_status'),
     path('orders/<int:order_id>/success/', views.order_success, name='order_success'),
     
     
@@ -7,28 +7,68 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 import requests
-import base64
-from datetime import datetime
+import time
 from django.conf import settings
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import action
 from rest_framework.decorators import permission_classes
+from rest_framework.decorators import throttle_classes
 from rest_framework.permissions import AllowAny
 from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from django.urls import reverse
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 from requests.auth import HTTPBasicAuth
+from .analytics import group_totals, sales_report, top_products
+from .async_api import AsyncAPIView, async_api_view, render, request_data
+from .db_routers import ReplicaReadMixin
+from .hashing import HashPoolBusy, get_hashing_pool
+from .mpesa import MpesaError, astk_push
+from .notifications import PaymentStatusSubscription
+from .payments import apply_stk_result, drain_callback_inbox, parse_stk_callback, send_stk_push
+from .product_cache import aget_product_rows, aget_stock_levels
+from .receipt_cache import get_receipt, set_receipt
+from .sales import SALES_WINDOWS
+from .tasks import submit_on_commit
+from .throttling import MpesaCallbackThrottle, MpesaSimulateThrottle, SlidingWindowThrottle
 
 User = get_user_model()
 
 
-class BuyerRegisterView(generics.CreateAPIView):
+class AuthBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-in attempts in progress, please retry shortly."
+    default_code = "auth_busy"
+    wait = 1  # seconds, sent as Retry-After
+
+
+class HashPoolBusyMixin:
+    """Views that hash passwords: a saturated hashing pool is a 503, not a 500."""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, HashPoolBusy):
+            exc = AuthBusy()
+        return super().handle_exception(exc)
+
+
+class BuyerRegisterView(HashPoolBusyMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
     serializer_class = BuyerRegisterSerializer
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = "register"
     
-class LoginView(generics.GenericAPIView):
+class LoginView(HashPoolBusyMixin, generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = LoginSerializer
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = "login"
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -38,6 +78,82 @@ class LoginView(generics.GenericAPIView):
 
 
 
+# token/ checks passwords just like login/, so it shares the login limit
+class ThrottledTokenObtainPairView(HashPoolBusyMixin, TokenObtainPairView):
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = "login"
+
+
+# Admin: password hashing pool metrics, for sizing workers against login traffic
+class AuthMetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_hashing_pool().metrics())
+
+
+def date_param(request, name):
+    """?<name>=YYYY-MM-DD as a date, or None when absent."""
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: "Use the YYYY-MM-DD format."})
+
+
+def analytics_date_range(request, default_days=30):
+    """Inclusive ?start=/?end= range, the last default_days days by default."""
+    end = date_param(request, "end") or timezone.localdate()
+    start = date_param(request, "start") or end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValidationError({"start": "Must not be after end."})
+    if (end - start).days >= settings.ANALYTICS_MAX_DAYS:
+        raise ValidationError({"start": f"Ranges are limited to {settings.ANALYTICS_MAX_DAYS} days."})
+    return start, end
+
+
+# Admin analytics: read only the daily rollups kept by rollup_daily_sales (see analytics.py)
+class SalesAnalyticsView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        start, end = analytics_date_range(request)
+        days, totals = sales_report(start, end)
+        return Response({
+            "start": start,
+            "end": end,
+            "totals": SalesTotalsSerializer(totals).data,
+            "days": DailySalesSerializer(days, many=True).data,
+        })
+
+
+class ProductAnalyticsView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        start, end = analytics_date_range(request)
+        products = top_products(start, end, limit_param(request, default=20, maximum=100))
+        return Response({
+            "start": start,
+            "end": end,
+            "products": ProductSalesTotalsSerializer(products, many=True).data,
+        })
+
+
+class GroupAnalyticsView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        start, end = analytics_date_range(request)
+        return Response({
+            "start": start,
+            "end": end,
+            "groups": GroupSalesTotalsSerializer(group_totals(start, end), many=True).data,
+        })
+
+
 # Admin: create product
 class ProductCreateView(generics.CreateAPIView):
     queryset = Product.objects.all()
@@ -54,35 +170,155 @@ class ProductDetailAdminView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAdminUser]
     lookup_field = "product_code"
 
-# Public: list products with optional group filter
-class ProductListView(generics.ListAPIView):
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
+def product_fields(request):
+    """ProductSerializer fields picked by ?fields= / ?exclude= (all by default)."""
+    return FieldSelection.from_request(request).filter(ProductSerializer.Meta.fields)
+
+
+def requested_product_codes(request):
+    """?codes=PRD-A,PRD-B (or repeated ?codes=), at most PRODUCT_BATCH_MAX_CODES."""
+    codes = [code.strip() for value in request.GET.getlist("codes") for code in value.split(",") if code.strip()]
+    if not codes:
+        raise ValidationError({"codes": "Pass one or more comma-separated product codes."})
+    if len(codes) > settings.PRODUCT_BATCH_MAX_CODES:
+        raise ValidationError({"codes": f"At most {settings.PRODUCT_BATCH_MAX_CODES} product codes per request."})
+    return codes
+
+
+def limit_param(request, default=None, maximum=None):
+    """?limit= as a positive int (capped at maximum), or default when absent."""
+    limit = request.GET.get("limit")
+    if not limit:
+        return default
+    if not limit.isdigit() or int(limit) < 1:
+        raise ValidationError({"limit": "A positive integer is required."})
+    return min(int(limit), maximum) if maximum else int(limit)
+
+
+# Public: list products with optional group filter (async, see async_api)
+class ProductListView(AsyncAPIView):
+    use_replica = True
+
+    # ?sort= options; each is served by an index on Product (alone or after group)
+    SORTS = {
+        "newest": "-date_posted",
+        "price_asc": "effective_price",
+        "price_desc": "-effective_price",
+        "discount": "-discount_percentage",
+    }
 
     def get_queryset(self):
-        queryset = Product.objects.all().order_by("-date_posted")
-        group = self.request.query_params.get("group")
+        sort = self.request.GET.get("sort") or "newest"
+        if sort not in self.SORTS:
+            raise ValidationError({"sort": f"Choose one of: {', '.join(self.SORTS)}."})
+        queryset = Product.objects.all().order_by(self.SORTS[sort])
+        group = self.request.GET.get("group")
         if group:
             queryset = queryset.filter(group=group)
+        min_discount = self.request.GET.get("min_discount")
+        if min_discount:
+            try:
+                min_discount = Decimal(min_discount)
+            except InvalidOperation:
+                min_discount = None
+            if min_discount is None or not min_discount.is_finite():  # NaN/Infinity parse too
+                raise ValidationError({"min_discount": "A number is required."})
+            queryset = queryset.filter(discount_percentage__gte=min_discount)
+        limit = limit_param(self.request)
+        if limit:
+            # Top-N pages (e.g. biggest deals) stop after N rows of the index
+            queryset = queryset[:limit]
         return queryset
 
+    async def get(self, request):
+        # Read-only: plain rows and dicts instead of model instances + ProductSerializer
+        serializer = ProductValuesSerializer(request, product_fields(request))
+        rows = self.get_queryset().values(*serializer.columns)
+        return render([serializer.to_representation(row) async for row in rows])
+
 # Public: single product (using product_code instead of id)
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
-    lookup_field = "product_code"
+class ProductDetailView(AsyncAPIView):
+    use_replica = True
+
+    async def get(self, request, product_code):
+        serializer = ProductValuesSerializer(request, product_fields(request))
+        row = (await aget_product_rows([product_code])).get(product_code)
+        if row is None:
+            raise NotFound("No Product matches the given query.")
+        return render(serializer.to_representation(row))
+
+# Public: "you may also like" for a product, precomputed by refresh_related_products
+class RelatedProductsView(AsyncAPIView):
+    use_replica = True
+
+    async def get(self, request, product_code):
+        serializer = ProductValuesSerializer(request, product_fields(request))
+        # One query: the product's RelatedProduct rows (product, rank index) joined to their products
+        rows = (
+            Product.objects.filter(related_to__product__product_code=product_code)
+            .order_by("related_to__rank")
+            .values(*serializer.columns)
+        )
+        related = [serializer.to_representation(row) async for row in rows]
+        # Empty: tell "nothing related yet" apart from an unknown product
+        if not related and not await Product.objects.filter(product_code=product_code).aexists():
+            raise NotFound("No Product matches the given query.")
+        return render(related)
+
+# Public: several products by code in one call (wishlists, recently viewed, cart previews)
+class ProductBatchView(AsyncAPIView):
+    use_replica = True
+
+    async def get(self, request):
+        codes = requested_product_codes(request)
+        serializer = ProductValuesSerializer(request, product_fields(request))
+        rows = await aget_product_rows(codes)
+        # Request order, null where a code doesn't exist
+        return render({
+            "results": [serializer.to_representation(rows[code]) if code in rows else None for code in codes],
+            "missing": [code for code in dict.fromkeys(codes) if code not in rows],
+        })
 
-# Distinct filter options API
-class ProductFiltersView(APIView):
-    permission_classes = [permissions.AllowAny]
+# Public: products ranked by units sold over ?window= (7d or 30d), from the sales rollup
+class BestSellersView(AsyncAPIView):
+    use_replica = True
+
+    async def get(self, request):
+        window = request.GET.get("window") or "30d"
+        if window not in SALES_WINDOWS:
+            raise ValidationError({"window": f"Choose one of: {', '.join(SALES_WINDOWS)}."})
+        limit = limit_param(request, default=20, maximum=100)
+
+        serializer = ProductValuesSerializer(request, product_fields(request))
+        rows = (
+            Product.objects.filter(**{f"sales__units_{window}__gt": 0})
+            .order_by(f"-sales__units_{window}", f"-sales__revenue_{window}")
+            .values(*serializer.columns)[:limit]
+        )
+        return render([serializer.to_representation(row) async for row in rows])
 
-    def get(self, request):
-        collections = Product.objects.values_list("collection", flat=True).distinct()
-        colors = Product.objects.values_list("color", flat=True).distinct()
-        sizes = Product.objects.values_list("size", flat=True).distinct()
-        prices = Product.objects.values_list("price", flat=True).distinct()
-        return Response({
+# Public: {product_code: available quantity} for pre-checkout availability checks.
+# Reads the primary (not a replica) on cache misses so a refill is never stale.
+class ProductStockView(AsyncAPIView):
+    async def get(self, request):
+        codes = requested_product_codes(request)
+        levels = await aget_stock_levels(codes)
+        # null where a code doesn't exist
+        return render({code: levels.get(code) for code in codes})
+
+# Distinct filter options API
+class ProductFiltersView(AsyncAPIView):
+    use_replica = True
+
+    async def get(self, request):
+        async def distinct(field):
+            return [value async for value in Product.objects.values_list(field, flat=True).distinct()]
+
+        collections = await distinct("collection")
+        colors = await distinct("color")
+        sizes = await distinct("size")
+        prices = await distinct("price")
+        return render({
             "collections": [c for c in collections if c],
             "colors": [c for c in colors if c],
             "sizes": [s for s in sizes if s],
@@ -91,13 +327,22 @@ class ProductFiltersView(APIView):
 
     
     
+def sparse_context(request):
+    # ?fields= / ?exclude= for SparseFieldsMixin serializers
+    return {"request": request, "fields": FieldSelection.from_request(request)}
+
+
 class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
+    def cart_response(self, request, cart, status_code=status.HTTP_200_OK):
+        serializer = CartSerializer(cart, context=sparse_context(request))
+        sparse_prefetch([cart], serializer)
+        return Response(serializer.data, status=status_code)
+
     def list(self, request):
         cart, _ = Cart.objects.get_or_create(buyer=request.user)
-        serializer = CartSerializer(cart, context={"request": request})
-        return Response(serializer.data)
+        return self.cart_response(request, cart)
 
     def create(self, request):
         product_code = request.data.get("product_code")
@@ -116,8 +361,7 @@ class CartViewSet(viewsets.ViewSet):
             cart_item.quantity += quantity
             cart_item.save()
 
-        serializer = CartSerializer(cart, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.cart_response(request, cart, status.HTTP_201_CREATED)
 
     def update(self, request, pk=None):
         cart, _ = Cart.objects.get_or_create(buyer=request.user)
@@ -127,51 +371,55 @@ class CartViewSet(viewsets.ViewSet):
         cart_item.quantity = quantity
         cart_item.save()
 
-        serializer = CartSerializer(cart, context={"request": request})
-        return Response(serializer.data)
+        return self.cart_response(request, cart)
 
     def destroy(self, request, pk=None):
         cart, _ = Cart.objects.get_or_create(buyer=request.user)
         cart_item = get_object_or_404(CartItem, cart=cart, id=pk)
         cart_item.delete()
 
-        serializer = CartSerializer(cart, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.cart_response(request, cart)
 
 
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def mpesa_payment_view(request):
-    phone_number = request.data.get("phone_number")
-    order_id = request.data.get("order_id")
+@async_api_view(["POST"])
+async def mpesa_payment_view(request):
+    """
+    Start an M-Pesa STK push for one of the buyer's orders.
+
+    Async so that waiting on Daraja (OAuth + STK push) doesn't hold a worker
+    thread under ASGI.
+    """
+    data = request_data(request)
+    phone_number = data.get("phone_number")
+    order_id = data.get("order_id")
 
     if not phone_number or not order_id:
-        return Response({"error": "Phone number and order_id are required"}, status=400)
+        return render({"error": "Phone number and order_id are required"}, status=400)
 
     # Validate phone number format
     if not phone_number.startswith("254") or len(phone_number) != 12:
-        return Response({"error": "Phone number must be in format 254XXXXXXXXX"}, status=400)
+        return render({"error": "Phone number must be in format 254XXXXXXXXX"}, status=400)
     
     # ✅ Get the order & validate it belongs to user
     try:
-        order = Order.objects.get(id=order_id, buyer=request.user)
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found or doesn't belong to you"}, status=404)
+        order = await Order.objects.aget(id=order_id, buyer_id=request.user.id)
+    except (Order.DoesNotExist, ValueError):
+        return render({"error": "Order not found or doesn't belong to you"}, status=404)
     
     # ✅ Check if order is already paid
     if order.status == "paid":
-        return Response({"error": "Order is already paid"}, status=400)
+        return render({"error": "Order is already paid"}, status=400)
     
     # ✅ Check if there's already a pending transaction for this order
-    existing_pending = Transaction.objects.filter(
+    existing_pending = await Transaction.objects.filter(
         order=order, 
-        status="pending"
-    ).first()
+        status__in=["initiating", "pending"]
+    ).afirst()
     
     if existing_pending:
-        return Response({
+        return render({
             "error": "There's already a pending payment for this order",
             "checkout_request_id": existing_pending.checkout_id
         }, status=400)
@@ -180,84 +428,39 @@ def mpesa_payment_view(request):
     
     # ✅ Validate amount is greater than 0
     if amount <= 0:
-        return Response({"error": "Order amount must be greater than 0"}, status=400)
+        return render({"error": "Order amount must be greater than 0"}, status=400)
+
+    if settings.MPESA_ASYNC_STK_PUSH:
+        # ✅ Record the attempt and let a background worker talk to Daraja
+        transaction = await Transaction.objects.acreate(
+            buyer_id=request.user.id,
+            order=order,
+            amount=amount,
+            phone_number=phone_number,
+            status="initiating"
+        )
+        await sync_to_async(submit_on_commit)(send_stk_push, transaction.id)
 
-    try:
-        # Use settings instead of hardcoded values
-        consumer_key = settings.MPESA_CONSUMER_KEY
-        consumer_secret = settings.MPESA_CONSUMER_SECRET
-        shortcode = settings.MPESA_SHORTCODE
-        passkey = settings.MPESA_PASSKEY
-        callback_url = settings.MPESA_CALLBACK_URL
+        return render({
+            "success": True,
+            "message": "Payment is being initiated. Check your phone shortly to complete payment.",
+            "order_id": order.id,
+            "amount": float(amount),
+            "phone_number": phone_number,
+            "transaction_id": transaction.id,
+            "transaction_status": transaction.status,
+            "status_url": reverse("check_payment_status", args=[order.id]),
+        }, status=202)
 
+    try:
         print(f"🔑 Processing payment for Order #{order.id}, Amount: {amount}")
 
-        # 1. Get Access Token
-        token_url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-        token_response = requests.get(token_url, auth=HTTPBasicAuth(consumer_key, consumer_secret))
-        
-        if token_response.status_code != 200:
-            return Response({
-                "error": f"Failed to get access token: {token_response.text}",
-                "status_code": token_response.status_code
-            }, status=400)
-
-        if not token_response.text.strip():
-            return Response({
-                "error": "Empty response from M-Pesa OAuth endpoint"
-            }, status=400)
+        res_data = await astk_push(phone_number, amount, order.id)
 
-        try:
-            token_data = token_response.json()
-        except ValueError as e:
-            return Response({
-                "error": f"Invalid JSON response from M-Pesa: {token_response.text}"
-            }, status=400)
-            
-        access_token = token_data.get("access_token")
-        if not access_token:
-            return Response({"error": "No access token received"}, status=400)
-
-        # 2. Generate Password
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        data_to_encode = shortcode + passkey + timestamp
-        password = base64.b64encode(data_to_encode.encode()).decode("utf-8")
-
-        # 3. Make STK Push Request
-        stk_url = f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest"
-        stk_headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "BusinessShortCode": shortcode,
-            "Password": password,
-            "Timestamp": timestamp,
-            "TransactionType": "CustomerPayBillOnline",
-            "Amount": int(amount),
-            "PartyA": phone_number,
-            "PartyB": shortcode,
-            "PhoneNumber": phone_number,
-            "CallBackURL": callback_url,
-            "AccountReference": f"Order_{order.id}",
-            "TransactionDesc": f"Payment for Order #{order.id}"
-        }
-
-        stk_response = requests.post(stk_url, json=payload, headers=stk_headers)
-        
-        if stk_response.status_code != 200:
-            return Response({
-                "error": f"STK Push failed: {stk_response.text}",
-                "status_code": stk_response.status_code
-            }, status=stk_response.status_code)
-
-        res_data = stk_response.json()
-
-        # 4. Save Transaction if STK push is accepted
+        # Save Transaction if STK push is accepted
         if res_data.get("ResponseCode") == "0":
-            transaction = Transaction.objects.create(
-                buyer=request.user,
+            transaction = await Transaction.objects.acreate(
+                buyer_id=request.user.id,
                 order=order, 
                 amount=amount,
                 checkout_id=res_data.get("CheckoutRequestID"),
@@ -267,12 +470,12 @@ def mpesa_payment_view(request):
             
             # ✅ Update order status to show payment is being processed
             order.status = "pending"
-            order.save()
+            await order.asave()
             
             print(f"💾 Transaction created for Order #{order.id}")
             
             # ✅ Return comprehensive response
-            return Response({
+            return render({
                 "success": True,
                 "message": "STK push sent successfully. Check your phone to complete payment.",
                 "checkout_request_id": res_data.get("CheckoutRequestID"),
@@ -284,7 +487,7 @@ def mpesa_payment_view(request):
                 "response_code": res_data.get("ResponseCode")
             }, status=200)
         else:
-            return Response({
+            return render({
                 "error": "STK Push was rejected",
                 "response_code": res_data.get("ResponseCode"),
                 "response_description": res_data.get("ResponseDescription"),
@@ -292,86 +495,30 @@ def mpesa_payment_view(request):
                 "error_message": res_data.get("errorMessage")
             }, status=400)
 
-    except requests.exceptions.RequestException as e:
-        print(f"🔥 Network Error: {str(e)}")
-        return Response({"error": f"Network error: {str(e)}"}, status=500)
+    except MpesaError as e:
+        return render(e.as_response_data(), status=e.status_code)
     except Exception as e:
         print(f"🔥 General Error: {str(e)}")
-        return Response({"error": f"Server error: {str(e)}"}, status=500)
+        return render({"error": f"Server error: {str(e)}"}, status=500)
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([MpesaCallbackThrottle])
 def mpesa_callback(request):
-    """Enhanced callback to handle M-Pesa payment confirmations"""
-    print(f"📞 M-Pesa Callback received: {request.data}")
-    
-    data = request.data
-    stk_callback = data.get("Body", {}).get("stkCallback", {})
-    checkout_id = stk_callback.get("CheckoutRequestID")
-    result_code = stk_callback.get("ResultCode")
-    result_desc = stk_callback.get("ResultDesc")
-    
-    if not checkout_id:
-        print("❌ No CheckoutRequestID in callback")
-        return Response({"ResultCode": 0, "ResultDesc": "No CheckoutRequestID found"})
-
-    try:
-        transaction = Transaction.objects.get(checkout_id=checkout_id)
-        print(f"🔍 Found transaction: {transaction.id} for order: {transaction.order.id}")
+    """
+    Acknowledge M-Pesa payment confirmations straight away.
 
-        if result_code == 0:  # ✅ Payment successful
-            # Extract payment details from callback metadata
-            callback_metadata = stk_callback.get("CallbackMetadata", {})
-            items = callback_metadata.get("Item", [])
-            
-            mpesa_receipt = None
-            transaction_date = None
-            amount_paid = None
-            
-            for item in items:
-                if item.get("Name") == "MpesaReceiptNumber":
-                    mpesa_receipt = item.get("Value")
-                elif item.get("Name") == "TransactionDate":
-                    transaction_date = item.get("Value")
-                elif item.get("Name") == "Amount":
-                    amount_paid = item.get("Value")
-            
-            # ✅ Update transaction
-            transaction.status = "success"
-            transaction.result_desc = result_desc
-            transaction.mpesa_receipt = mpesa_receipt
-            transaction.save()
-            
-            # ✅ Update order status
-            if transaction.order:
-                transaction.order.status = "paid"
-                transaction.order.save()
-                print(f"✅ Order {transaction.order.id} marked as PAID with receipt: {mpesa_receipt}")
-                
-                # ✅ Optionally reduce product stock here
-                for item in transaction.order.items.all():
-                    product = item.product
-                    if product.stock >= item.quantity:
-                        product.stock -= item.quantity
-                        product.save()
-                        print(f"📦 Reduced stock for {product.name}: {item.quantity} units")
-
-        else:  # ❌ Payment failed
-            transaction.status = "failed"
-            transaction.result_desc = result_desc
-            transaction.save()
-            
-            # ✅ Reset order status back to pending
-            if transaction.order:
-                transaction.order.status = "pending"
-                transaction.order.save()
-                print(f"❌ Payment failed for Order {transaction.order.id}: {result_desc}")
+    The raw payload is stored in the callback inbox with a single insert and
+    processed by a background worker (see payments.drain_callback_inbox).
+    """
+    data = request.data
+    checkout_id = data.get("Body", {}).get("stkCallback", {}).get("CheckoutRequestID")
 
-    except Transaction.DoesNotExist:
-        print(f"❌ Transaction with CheckoutID {checkout_id} not found")
+    MpesaCallback.objects.create(payload=data, checkout_id=checkout_id)
+    submit_on_commit(drain_callback_inbox)
 
-    return Response({"ResultCode": 0, "ResultDesc": "Callback processed successfully"})
+    return Response({"ResultCode": 0, "ResultDesc": "Callback received successfully"})
 
 
 
@@ -411,6 +558,7 @@ def test_mpesa_credentials(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([MpesaSimulateThrottle])
 def simulate_successful_payment(request):
     """
     Test endpoint to simulate a successful M-Pesa payment
@@ -445,36 +593,14 @@ def simulate_successful_payment(request):
     }
     
     try:
-        stk_callback = success_callback_data.get("Body", {}).get("stkCallback", {})
-        checkout_id = stk_callback.get("CheckoutRequestID")
-        result_code = stk_callback.get("ResultCode")
-        result_desc = stk_callback.get("ResultDesc")
-
-        if not checkout_id:
-            return Response({"error": "Invalid callback data"}, status=400)
-
-        try:
-            transaction = Transaction.objects.get(checkout_id=checkout_id)
-        except Transaction.DoesNotExist:
-            return Response({"error": f"Transaction with CheckoutID {checkout_id} not found"}, status=404)
-
-        # ✅ Mark transaction
-        if result_code == 0:
-            transaction.status = "success"
-            transaction.mpesa_receipt = "SIM123456789"
-            transaction.result_desc = result_desc
-            transaction.save()
-
-            # ✅ If transaction is linked to order, mark order as paid
-            if transaction.order:
-                transaction.order.status = "paid"
-                transaction.order.save()
-                print(f"✅ SIMULATION - Order {transaction.order.id} marked as PAID")
+        result = parse_stk_callback(success_callback_data)
+        transaction, _ = apply_stk_result(**result)
 
-        else:
-            transaction.status = "failed"
-            transaction.result_desc = result_desc
-            transaction.save()
+        if transaction is None:
+            return Response({"error": f"Transaction with CheckoutID {checkout_request_id} not found"}, status=404)
+
+        if transaction.order:
+            print(f"✅ SIMULATION - Order {transaction.order.id} is {transaction.order.status}")
 
         return Response({
             "success": True,
@@ -490,95 +616,182 @@ def simulate_successful_payment(request):
 
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def check_payment_status(request, order_id):
+def orders_with_latest_transaction(queryset):
+    """Annotate each order with its latest transaction's fields (one query)."""
+    latest = Transaction.objects.filter(order=OuterRef("pk")).order_by("-created_at", "-id")
+    return queryset.annotate(**{
+        f"latest_transaction_{field}": Subquery(latest.values(field)[:1])
+        for field in ("status", "mpesa_receipt", "created_at", "checkout_id", "result_desc")
+    })
+
+
+def with_successful_payment(queryset, order_ref):
+    """Annotate payment_receipt/_date/_phone_number from the order's latest successful transaction."""
+    successful = Transaction.objects.filter(order=OuterRef(order_ref), status="success").order_by("-created_at", "-id")
+    return queryset.annotate(
+        payment_receipt=Subquery(successful.values("mpesa_receipt")[:1]),
+        payment_date=Subquery(successful.values("created_at")[:1]),
+        payment_phone_number=Subquery(successful.values("phone_number")[:1]),
+    )
+
+
+def payment_status_data(order):
+    response_data = {
+        "order_id": order.id,
+        "order_status": order.status,
+        "order_total": float(order.total_price),
+        "order_created": order.created_at,
+    }
+    
+    if order.latest_transaction_status is not None:
+        response_data.update({
+            "transaction_status": order.latest_transaction_status,
+            "mpesa_receipt": order.latest_transaction_mpesa_receipt,
+            "transaction_created": order.latest_transaction_created_at,
+            "checkout_request_id": order.latest_transaction_checkout_id,
+            "result_description": order.latest_transaction_result_desc,
+        })
+    else:
+        response_data["transaction_status"] = "no_transaction"
+    return response_data
+
+
+@async_api_view(["GET"])
+async def check_payment_status(request, order_id):
     """Check the payment status of an order"""
+    data = await _payment_status_data_async(order_id, request.user)
+    if data is None:
+        return render({"error": "Order not found"}, status=404)
+
+    return render(data)
+
+
+@async_api_view(["GET"])
+async def wait_for_payment_status(request, order_id):
+    """
+    Long-poll variant of check_payment_status.
+
+    GET /orders/<order_id>/payment-status/wait/?since=pending&timeout=25
+
+    Responds as soon as the transaction status differs from ``since`` (the
+    status the client last saw), or after ``timeout`` seconds with
+    ``"changed": false``. This is an async view so, under ASGI, held
+    connections don't tie up a worker thread.
+
+    Under WSGI (the default ``SERVER_MODE``) a held request would block a
+    sync worker for the whole wait, so the status is returned immediately
+    and clients keep polling.
+    """
     try:
-        order = Order.objects.get(id=order_id, buyer=request.user)
-        
-        # Get the latest transaction for this order
-        latest_transaction = Transaction.objects.filter(order=order).order_by('-created_at').first()
-        
-        response_data = {
-            "order_id": order.id,
-            "order_status": order.status,
-            "order_total": float(order.total_price),
-            "order_created": order.created_at,
-        }
-        
-        if latest_transaction:
-            response_data.update({
-                "transaction_status": latest_transaction.status,
-                "mpesa_receipt": latest_transaction.mpesa_receipt,
-                "transaction_created": latest_transaction.created_at,
-                "checkout_request_id": latest_transaction.checkout_id,
-                "result_description": latest_transaction.result_desc,
-            })
-        else:
-            response_data["transaction_status"] = "no_transaction"
-            
-        return Response(response_data)
-        
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found"}, status=404)
+        timeout = float(request.GET.get("timeout", settings.PAYMENT_STATUS_WAIT_DEFAULT))
+    except ValueError:
+        return render({"error": "timeout must be a number"}, status=400)
+    timeout = max(0, min(timeout, settings.PAYMENT_STATUS_WAIT_MAX))
+    if settings.SERVER_MODE != "asgi":
+        timeout = 0
+
+    async with PaymentStatusSubscription(order_id) as subscription:
+        data = await _payment_status_data_async(order_id, request.user)
+        if data is None:
+            return render({"error": "Order not found"}, status=404)
+
+        since = request.GET.get("since", data["transaction_status"])
+        changed = data["transaction_status"] != since
+        deadline = time.monotonic() + timeout
+        # A notification may not change the status (spurious, or another field):
+        # keep waiting out the rest of the timeout until it does
+        while not changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await subscription.wait(remaining):
+                break
+            data = await _payment_status_data_async(order_id, request.user) or data
+            changed = data["transaction_status"] != since
+
+    data["changed"] = changed
+    return render(data)
+
+
+async def _payment_status_data_async(order_id, user):
+    order = await orders_with_latest_transaction(
+        Order.objects.filter(id=order_id, buyer_id=user.id)
+    ).afirst()
+    if order is None:
+        return None
+    return payment_status_data(order)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def order_success(request, order_id):
     """Get order success details after payment"""
-    try:
-        order = Order.objects.get(id=order_id, buyer=request.user)
-        
-        if order.status != "paid":
-            return Response({"error": "Order is not yet paid"}, status=400)
-        
-        # Get successful transaction
-        successful_transaction = Transaction.objects.filter(
-            order=order, 
-            status="success"
+    # Receipts of paid orders are cached until the order changes (see receipt_cache)
+    response_data = get_receipt(request.user.id, order_id)
+    if response_data is not None:
+        return Response(response_data)
+
+    # One query: the order's items joined to the order and products, with the
+    # successful payment as subqueries
+    items = list(
+        with_successful_payment(
+            OrderItem.objects.filter(order_id=order_id, order__buyer=request.user), "order_id"
+        )
+        .select_related("order", "product")
+        .order_by("id")
+    )
+    if items:
+        order, payment = items[0].order, items[0]
+    else:
+        # An order without items (never placed through checkout)
+        order = payment = with_successful_payment(
+            Order.objects.filter(id=order_id, buyer=request.user), "pk"
         ).first()
+
+    if order is None:
+        return Response({"error": "Order not found"}, status=404)
         
-        order_items = []
-        for item in order.items.all():
-            order_items.append({
-                "product_name": item.product.name,
-                "product_code": item.product.product_code,
-                "quantity": item.quantity,
-                "price": float(item.price),
-                "total": float(item.total_price)
-            })
-        
-        response_data = {
-            "success": True,
-            "message": "Order payment successful!",
-            "order": {
-                "id": order.id,
-                "status": order.status,
-                "total_amount": float(order.total_price),
-                "created_at": order.created_at,
-                "items": order_items
-            }
+    if order.status != "paid":
+        return Response({"error": "Order is not yet paid"}, status=400)
+    
+    order_items = []
+    for item in items:
+        order_items.append({
+            "product_name": item.product.name,
+            "product_code": item.product.product_code,
+            "quantity": item.quantity,
+            "price": float(item.price),
+            "total": float(item.total_price)
+        })
+    
+    response_data = {
+        "success": True,
+        "message": "Order payment successful!",
+        "order": {
+            "id": order.id,
+            "status": order.status,
+            "total_amount": float(order.total_price),
+            "created_at": order.created_at,
+            "items": order_items
         }
-        
-        if successful_transaction:
-            response_data["payment"] = {
-                "mpesa_receipt": successful_transaction.mpesa_receipt,
-                "transaction_date": successful_transaction.created_at,
-                "phone_number": successful_transaction.phone_number
-            }
-            
-        return Response(response_data)
-        
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found"}, status=404)
+    }
+    
+    if payment.payment_date is not None:
+        response_data["payment"] = {
+            "mpesa_receipt": payment.payment_receipt,
+            "transaction_date": payment.payment_date,
+            "phone_number": payment.payment_phone_number
+        }
+
+    set_receipt(request.user.id, order_id, response_data)
+    return Response(response_data)
+
         
 # Buyer posts a contact message
 class ContactUsCreateView(generics.CreateAPIView):
     queryset = ContactUs.objects.all()
     serializer_class = ContactUsSerializer
     permission_classes = [permissions.AllowAny]  # anyone can submit
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = "contact"
 
 # Admin views all contact messages
 class ContactUsListView(generics.ListAPIView):
@@ -597,17 +810,19 @@ class ProfileView(generics.RetrieveAPIView):
 
 
 
-class OrderViewSet(viewsets.ViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def list(self, request):
-        orders = Order.objects.filter(buyer=request.user).order_by("-created_at")
-        serializer = OrderSerializer(orders, many=True, context={"request": request})
+        serializer = OrderSerializer(many=True, context=sparse_context(request))
+        serializer.instance = sparse_queryset(
+            Order.objects.filter(buyer=request.user).order_by("-created_at"), serializer
+        )
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
-        order = get_object_or_404(Order, id=pk, buyer=request.user)
-        serializer = OrderSerializer(order, context={"request": request})
+        serializer = OrderSerializer(context=sparse_context(request))
+        serializer.instance = get_object_or_404(sparse_queryset(Order.objects.all(), serializer), id=pk, buyer=request.user)
         return Response(serializer.data)
 
     @action(detail=False, methods=["post"])
@@ -633,7 +848,8 @@ class OrderViewSet(viewsets.ViewSet):
         # Clear cart
         cart.items.all().delete()
 
-        serializer = OrderSerializer(order, context={"request": request})
+        serializer = OrderSerializer(order, context=sparse_context(request))
+        sparse_prefetch([order], serializer)
         return Response(serializer.data, status=201)
 
 class CustomerAddressViewSet(viewsets.ModelViewSet):